@@ -0,0 +1,50 @@
+"""Benchmarks looking up handlers for a stream of packet headers.
+
+Run with `python -m benchmarks.bench_dispatch`. Compares the previous path
+(constructing a `PacketID` and looking it up in a dict) against the raw ID
+indexed `PacketDispatcher`.
+"""
+
+import random
+import timeit
+
+from osuclient.client.dispatch import PacketDispatcher
+from osuclient.packets.constants import PacketID
+
+PACKETS = 100_000
+RUNS = 10
+
+async def handler(ctx) -> None:
+    pass
+
+HANDLED = (
+    PacketID.SRV_LOGIN_REPLY,
+    PacketID.SRV_PROTOCOL_VERSION,
+    PacketID.SRV_USER_PRESENCE,
+    PacketID.SRV_USER_LOGOUT,
+)
+
+def main() -> None:
+    ids = [random.choice(list(PacketID)).value for _ in range(PACKETS)]
+
+    handlers = {packet_id: handler for packet_id in HANDLED}
+    dispatcher = PacketDispatcher()
+    for packet_id in HANDLED:
+        dispatcher.register(packet_id, handler)
+
+    def legacy() -> None:
+        get = handlers.get
+        for raw_id in ids:
+            get(PacketID(raw_id))
+
+    def table() -> None:
+        wants = dispatcher.wants
+        for raw_id in ids:
+            wants(raw_id)
+
+    for name, func in (("dict of PacketID", legacy), ("dispatch table", table)):
+        elapsed = timeit.timeit(func, number=RUNS) / RUNS
+        print(f"{name:>16}: {PACKETS / elapsed / 1e6:.2f}M packets/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Benchmarks splitting a login-sized response into packet contexts.
+
+Run with `python -m benchmarks.bench_framing`. The time per packet should stay
+flat as the response grows, whereas the legacy `remove_excess` approach grows
+linearly per packet (quadratically overall).
+"""
+
+import timeit
+
+from osuclient.packets.constants import PacketID
+from osuclient.packets.rw import (
+    PacketContext,
+    PacketReader,
+    PacketWriter,
+)
+
+SIZES = (1_000, 5_000, 10_000, 20_000)
+
+def build_response(count: int) -> bytes:
+    """Builds a response made of `count` user presence packets."""
+
+    buf = bytearray()
+    for i in range(count):
+        buf += (
+            PacketWriter()
+                .write_i32(i)
+                .write_str(f"player{i}")
+                .write_u8(24)
+                .write_u8(0)
+                .write_u8(1)
+                .write_f32(0.0)
+                .write_f32(0.0)
+                .write_i32(i)
+                .finish(PacketID.SRV_USER_PRESENCE)
+        )
+    return bytes(buf)
+
+def legacy_create_from_buffers(buf: bytes) -> list[PacketContext]:
+    """The previous implementation, copying the buffer tail per packet."""
+
+    reader = PacketReader(buf)
+    ctxs = []
+    while not reader.empty:
+        packet_id, length = reader.read_header()
+        ctxs.append(PacketContext(packet_id, length, reader))
+        reader = PacketReader(reader.remove_excess(length))
+    return ctxs
+
+def main() -> None:
+    print(f"{'packets':>8} {'legacy (us/pkt)':>16} {'framed (us/pkt)':>16}")
+    for size in SIZES:
+        response = build_response(size)
+        runs = 3
+        legacy = timeit.timeit(
+            lambda: legacy_create_from_buffers(response), number=runs,
+        )
+        framed = timeit.timeit(
+            lambda: PacketContext.create_from_buffers(response), number=runs,
+        )
+        print(
+            f"{size:>8} {legacy / runs / size * 1e6:>16.3f} "
+            f"{framed / runs / size * 1e6:>16.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
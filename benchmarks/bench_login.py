@@ -0,0 +1,100 @@
+"""Benchmarks logging in many clients against a local bancho stub.
+
+Run with `python -m benchmarks.bench_login`. Compares clients each creating
+their own aiohttp session (the previous behaviour of `BanchoClient.new`)
+against clients sharing a `ClientPool`. Requires enough file descriptors for
+the largest client count (see `ulimit -n`).
+"""
+
+import asyncio
+import multiprocessing
+import time
+
+from aiohttp import web
+
+from osuclient.client.bancho import (
+    BanchoClient,
+    HWIDInfo,
+    OsuVersion,
+    TargetServer,
+)
+from osuclient.client.pool import ClientPool
+from osuclient.packets.constants import PacketID
+from osuclient.packets.rw import PacketWriter
+
+HOST = "127.0.0.1"
+PORT = 8790
+CLIENT_COUNTS = (1, 100, 10_000)
+# The most logins in flight at once.
+CONCURRENCY = 256
+
+LOGIN_RESPONSE = bytes(
+    PacketWriter().write_i32(19).finish(PacketID.SRV_PROTOCOL_VERSION)
+    + PacketWriter().write_i32(1000).finish(PacketID.SRV_LOGIN_REPLY)
+)
+
+async def login(request: web.Request) -> web.Response:
+    await request.read()
+    return web.Response(body=LOGIN_RESPONSE, headers={"cho-token": "token"})
+
+def serve() -> None:
+    app = web.Application()
+    app.router.add_post("/", login)
+    web.run_app(app, host=HOST, port=PORT, print=None, backlog=4096)
+
+async def login_all(clients: list[BanchoClient]) -> float:
+    """Logs in every client, returning the elapsed time."""
+
+    server = TargetServer(f"http://{HOST}:{PORT}/", "", "")
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def connect(client: BanchoClient) -> None:
+        async with semaphore:
+            assert await client.connect("user", "password", server)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connect(client) for client in clients))
+    return time.perf_counter() - start
+
+async def per_client(count: int) -> float:
+    clients = [
+        BanchoClient.new(OsuVersion(2022, 6, 29), HWIDInfo.generate_random())
+        for _ in range(count)
+    ]
+    try:
+        return await login_all(clients)
+    finally:
+        await asyncio.gather(*(
+            client.http.close() for client in clients if client.http is not None
+        ))
+
+async def pooled(count: int) -> float:
+    async with ClientPool() as pool:
+        clients = [
+            pool.new(OsuVersion(2022, 6, 29), HWIDInfo.generate_random())
+            for _ in range(count)
+        ]
+        elapsed = await login_all(clients)
+        await pool.close(logout=False)
+        return elapsed
+
+async def run() -> None:
+    for count in CLIENT_COUNTS:
+        for name, func in (("per-client", per_client), ("pool", pooled)):
+            elapsed = await func(count)
+            print(
+                f"{count:>6} clients, {name:>10}: "
+                f"{count / elapsed:,.0f} logins/s ({elapsed:.2f}s)"
+            )
+
+def main() -> None:
+    server = multiprocessing.Process(target=serve, daemon=True)
+    server.start()
+    time.sleep(1) # Give the server time to bind.
+    try:
+        asyncio.run(run())
+    finally:
+        server.terminate()
+
+if __name__ == "__main__":
+    main()
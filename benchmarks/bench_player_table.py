@@ -0,0 +1,89 @@
+"""Benchmarks the memory used to track many online users.
+
+Run with `python -m benchmarks.bench_player_table`. The same presences are
+read into the object-per-user `ServerState` and into the columnar
+`PlayerTable` (with and without NumPy), reporting the memory allocated per
+player and the time taken to read them.
+"""
+
+import gc
+import time
+import tracemalloc
+
+from osuclient.client.bancho import ServerState
+from osuclient.client.player_table import (
+    PlayerTable,
+    numpy,
+)
+from osuclient.packets.constants import PacketID
+from osuclient.packets.rw import (
+    PacketContext,
+    PacketWriter,
+)
+
+PLAYERS = 100_000
+
+def build_response(count: int) -> bytes:
+    """Builds a response made of `count` user presence packets."""
+
+    buf = bytearray()
+    for i in range(1, count + 1):
+        buf += (
+            PacketWriter()
+                .write_i32(i * 7)
+                .write_str(f"player{i}")
+                .write_u8(24)
+                .write_u8(i % 250)
+                .write_u8(1)
+                .write_f32(51.5)
+                .write_f32(-0.1)
+                .write_i32(i)
+                .finish(PacketID.SRV_USER_PRESENCE)
+        )
+    return bytes(buf)
+
+def measure(create, response: bytes) -> tuple[float, float]:
+    """Reads every presence into a new state, returning the bytes allocated
+    per player and the elapsed time."""
+
+    # Tracing allocations slows reading down, so it is timed separately.
+    elapsed = read(create(), response)
+
+    gc.collect()
+    tracemalloc.start()
+    state = create()
+    read(state, response)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(state) == PLAYERS
+    return size / PLAYERS, elapsed
+
+def read(state, response: bytes) -> float:
+    """Reads every presence in a response, returning the elapsed time."""
+
+    contexts = PacketContext.create_from_buffers(response)
+    start = time.perf_counter()
+    for ctx in contexts:
+        state.read_presence(ctx.reader)
+    return time.perf_counter() - start
+
+def main() -> None:
+    response = build_response(PLAYERS)
+
+    states = [
+        ("ServerState", ServerState),
+        ("PlayerTable (array)", lambda: PlayerTable(use_numpy=False)),
+    ]
+    if numpy is not None:
+        states.append(("PlayerTable (numpy)", PlayerTable))
+
+    for name, create in states:
+        per_player, elapsed = measure(create, response)
+        print(
+            f"{name:>20}: {per_player:6.0f} bytes/player, "
+            f"read in {elapsed * 1e3:.0f}ms"
+        )
+
+if __name__ == "__main__":
+    main()
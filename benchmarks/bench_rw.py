@@ -0,0 +1,128 @@
+"""Micro-benchmarks of the per-field cost of `PacketReader` and
+`PacketWriter`.
+
+Run with `python -m benchmarks.bench_rw`. Each field type is compared against
+the previous implementation, which sliced the buffer and used format strings
+on every call.
+"""
+
+import struct
+import timeit
+
+from osuclient.packets.rw import (
+    PacketReader,
+    PacketWriter,
+)
+
+FIELDS = 1_000
+RUNS = 200
+REPEATS = 5
+
+class LegacyWriter:
+    """The previous writer, packing into temporary bytes objects."""
+
+    def __init__(self) -> None:
+        self._buf = bytearray(b"\x00" * 7)
+
+    def write_u8(self, value: int) -> "LegacyWriter":
+        self._buf.append(value)
+        return self
+
+    def write_u16(self, value: int) -> "LegacyWriter":
+        self._buf.extend(struct.pack("<H", value))
+        return self
+
+    def write_i32(self, value: int) -> "LegacyWriter":
+        self._buf.extend(struct.pack("<i", value))
+        return self
+
+    def write_f32(self, value: float) -> "LegacyWriter":
+        self._buf.extend(struct.pack("<f", value))
+        return self
+
+    def write_str(self, value: str) -> "LegacyWriter":
+        self._buf.append(0xb)
+        length = len(value)
+        while length >= 0x80:
+            self._buf.append((length & 0x7f) | 0x80)
+            length >>= 7
+        self._buf.append(length)
+        self._buf.extend(value.encode())
+        return self
+
+class LegacyReader:
+    """The previous reader, slicing the buffer for every field."""
+
+    def __init__(self, buf: bytes) -> None:
+        self._buf = buf
+        self._pos = 0
+
+    def read_u8(self) -> int:
+        value = self._buf[self._pos]
+        self._pos += 1
+        return value
+
+    def read_u16(self) -> int:
+        value = struct.unpack("<H", self._buf[self._pos:self._pos + 2])[0]
+        self._pos += 2
+        return value
+
+    def read_i32(self) -> int:
+        value = struct.unpack("<i", self._buf[self._pos:self._pos + 4])[0]
+        self._pos += 4
+        return value
+
+    def read_f32(self) -> float:
+        value = struct.unpack("<f", self._buf[self._pos:self._pos + 4])[0]
+        self._pos += 4
+        return value
+
+def bench_write(writer_type: type, method: str, value: object) -> float:
+    """Returns the cost of a single write in nanoseconds."""
+
+    def run() -> None:
+        writer = writer_type()
+        write = getattr(writer, method)
+        for _ in range(FIELDS):
+            write(value)
+
+    return min(timeit.repeat(run, number=RUNS, repeat=REPEATS)) / RUNS / FIELDS * 1e9
+
+def bench_read(reader_type: type, method: str, size: int) -> float:
+    """Returns the cost of a single read in nanoseconds."""
+
+    buf = bytes(size * FIELDS)
+
+    def run() -> None:
+        reader = reader_type(buf)
+        read = getattr(reader, method)
+        for _ in range(FIELDS):
+            read()
+
+    return min(timeit.repeat(run, number=RUNS, repeat=REPEATS)) / RUNS / FIELDS * 1e9
+
+def main() -> None:
+    print(f"{'field':>10} {'legacy (ns)':>12} {'current (ns)':>13}")
+    for method, value in (
+        ("write_u8", 1),
+        ("write_u16", 1),
+        ("write_i32", 1),
+        ("write_f32", 1.0),
+        ("write_str", "Welcome to the lobby!"),
+    ):
+        legacy = bench_write(LegacyWriter, method, value)
+        current = bench_write(PacketWriter, method, value)
+        print(f"{method:>10} {legacy:>12.1f} {current:>13.1f}")
+
+    for method, size in (
+        ("read_u8", 1),
+        ("read_u16", 2),
+        ("read_i32", 4),
+        ("read_f32", 4),
+    ):
+        legacy = bench_read(LegacyReader, method, size)
+        current = bench_read(PacketReader, method, size)
+        print(f"{method:>10} {legacy:>12.1f} {current:>13.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmarks applying a login burst of user presences to `ServerState`.
+
+Run with `python -m benchmarks.bench_server_state`. Each presence packet is
+decoded and upserted, as the client's presence handler does. The previous
+list-backed state scanned every presence per insert, so it is only ran at
+the smaller sizes.
+"""
+
+import time
+
+from osuclient.client.bancho import ServerState
+from osuclient.client.player_state import PlayerPresence
+from osuclient.packets.constants import PacketID
+from osuclient.packets.rw import (
+    PacketContext,
+    PacketWriter,
+)
+
+SIZES = (1_000, 5_000, 50_000)
+# The largest size the list-backed state is ran at.
+LEGACY_MAX = 5_000
+
+class LegacyServerState:
+    """The previous list-backed implementation."""
+
+    def __init__(self) -> None:
+        self.presences: list[PlayerPresence] = []
+
+    def add_presence(self, presence: PlayerPresence) -> None:
+        for p in self.presences:
+            if p.id == presence.id:
+                return
+        self.presences.append(presence)
+
+    def read_presence(self, reader) -> None:
+        self.add_presence(PlayerPresence.from_reader(reader))
+
+def build_response(count: int) -> bytes:
+    """Builds a response made of `count` user presence packets."""
+
+    buf = bytearray()
+    for i in range(count):
+        buf += (
+            PacketWriter()
+                .write_i32(i)
+                .write_str(f"player{i}")
+                .write_u8(24)
+                .write_u8(0)
+                .write_u8(1)
+                .write_f32(0.0)
+                .write_f32(0.0)
+                .write_i32(i)
+                .finish(PacketID.SRV_USER_PRESENCE)
+        )
+    return bytes(buf)
+
+def apply(state, response: bytes) -> float:
+    """Applies every presence in a response, returning the elapsed time."""
+
+    contexts = PacketContext.create_from_buffers(response)
+    start = time.perf_counter()
+    for ctx in contexts:
+        state.read_presence(ctx.reader)
+    return time.perf_counter() - start
+
+def main() -> None:
+    for size in SIZES:
+        response = build_response(size)
+        for name, state_type in (
+            ("list", LegacyServerState),
+            ("indexed", ServerState),
+        ):
+            if state_type is LegacyServerState and size > LEGACY_MAX:
+                continue
+
+            state = state_type()
+            login = apply(state, response)
+            # A second burst refreshing every presence.
+            refresh = apply(state, response)
+            print(
+                f"{size:>6} presences, {name:>7}: login {login * 1e3:8.1f}ms, "
+                f"refresh {refresh * 1e3:8.1f}ms"
+            )
+
+if __name__ == "__main__":
+    main()
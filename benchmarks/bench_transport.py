@@ -0,0 +1,102 @@
+"""Benchmarks bancho polls through each HTTP client.
+
+Run with `python -m benchmarks.bench_transport`. Many sessions poll a local
+bancho stub (ran in a separate process, so only client-side work is timed
+in this one) through an aiohttp client session and through the lightweight
+`HTTPTransport`, reporting polls per second.
+"""
+
+import asyncio
+import multiprocessing
+import time
+
+from osuclient.client.bancho import (
+    BanchoSession,
+    create_http_session,
+)
+from osuclient.client.transport import HTTPTransport
+from osuclient.packets import builders
+
+HOST = "127.0.0.1"
+PORT = 8791
+SESSIONS = 500
+POLLS = 20
+
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"cho-token: token\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+
+class StubProtocol(asyncio.Protocol):
+    """Answers every request with an empty bancho response."""
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.Transport)
+        self.transport = transport
+        self.buf = bytearray()
+
+    def data_received(self, data: bytes) -> None:
+        self.buf += data
+        while (end := self.buf.find(b"\r\n\r\n")) >= 0:
+            length = 0
+            for line in bytes(self.buf[:end]).lower().split(b"\r\n"):
+                if line.startswith(b"content-length:"):
+                    length = int(line[len(b"content-length:"):])
+            if len(self.buf) < end + 4 + length:
+                return
+            del self.buf[:end + 4 + length]
+            self.transport.write(RESPONSE)
+
+def serve() -> None:
+    async def run() -> None:
+        loop = asyncio.get_event_loop()
+        server = await loop.create_server(
+            StubProtocol, HOST, PORT, backlog=4096,
+        )
+        await server.serve_forever()
+    asyncio.run(run())
+
+async def poll_all(http) -> float:
+    """Polls the stub `POLLS` times from each of `SESSIONS` sessions,
+    returning the elapsed time."""
+
+    url = f"http://{HOST}:{PORT}/"
+    heartbeat = bytes(builders.heartbeat())
+
+    async def poll(session: BanchoSession) -> None:
+        for _ in range(POLLS):
+            async for _ in session.stream(heartbeat):
+                pass
+
+    sessions = [BanchoSession("token", url, http) for _ in range(SESSIONS)]
+    start = time.perf_counter()
+    await asyncio.gather(*(poll(session) for session in sessions))
+    return time.perf_counter() - start
+
+async def run() -> None:
+    for name, create in (
+        ("aiohttp", create_http_session),
+        ("HTTPTransport", HTTPTransport),
+    ):
+        http = create()
+        try:
+            await poll_all(http) # Warm up the connections.
+            elapsed = await poll_all(http)
+        finally:
+            await http.close()
+        polls = SESSIONS * POLLS
+        print(f"{name:>13}: {polls / elapsed:,.0f} polls/s")
+
+def main() -> None:
+    server = multiprocessing.Process(target=serve, daemon=True)
+    server.start()
+    time.sleep(1) # Give the server time to bind.
+    try:
+        asyncio.run(run())
+    finally:
+        server.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -2,3 +2,12 @@ from . import bancho
 from . import exceptions
 from . import constants
 from . import player_state
+from . import dispatch
+from . import outbound
+from . import scheduler
+from . import timer_wheel
+from . import pool
+from . import transport
+from . import events
+from . import replies
+from . import player_table
@@ -1,11 +1,21 @@
 from dataclasses import dataclass
 from dataclasses import field
 from typing import (
+    Any,
+    AsyncIterable,
     Awaitable,
+    AsyncIterator,
     Callable,
+    Hashable,
+    Iterable,
+    Iterator,
     Optional,
+    Sequence,
+    Union,
 )
+from concurrent.futures import Executor
 import aiohttp
+import array
 import asyncio
 import random
 
@@ -13,12 +23,47 @@ from osuclient.packets.constants import PacketID
 from osuclient.utils import hashes
 from osuclient.packets.rw import (
     PacketContext,
+    PacketReader,
     ByteLike,
+    stream_packets,
 )
 from osuclient.packets import builders
 from . import exceptions
 from . import constants
+from .dispatch import (
+    DispatchMode,
+    Middleware,
+    PacketDispatcher,
+)
+from .events import (
+    OverflowPolicy,
+    PacketStream,
+)
+from .outbound import OutboundQueue
+from .replies import ReplyTable
 from .player_state import PlayerPresence
+from .player_table import PlayerTable
+from .scheduler import PollScheduler
+from .timer_wheel import TimerWheel
+from .transport import (
+    HTTPClient,
+    HTTPResponse,
+)
+
+def create_http_session(
+    connector: Optional[aiohttp.BaseConnector] = None,
+) -> aiohttp.ClientSession:
+    """Creates an aiohttp client session sending the osu! client's headers.
+
+    Args:
+        connector: The connector to use. If not provided, the session
+            creates its own.
+    """
+    return aiohttp.ClientSession(
+        connector=connector,
+        skip_auto_headers=["User-Agent"],
+        headers={"User-Agent": "osu!"},
+    )
 
 @dataclass
 class BanchoSession:
@@ -26,32 +71,103 @@ class BanchoSession:
 
     token: str
     url: str
-    http: aiohttp.ClientSession
+    # An aiohttp client session or an `HTTPTransport`.
+    http: HTTPClient
+    # The size of the last streamed response (in bytes).
+    response_size: int = 0
+    # The number of requests sent, used to order overlapping responses.
+    sequence: int = 0
+    # The sequence of the request whose response set the current token.
+    token_sequence: int = 0
 
     async def send(self, packet: ByteLike) -> bytes:
         """Sends a written packet buffer to bancho, returning the
         server's response."""
 
-        if self.token == "no" or not self.token:
-            raise exceptions.InvalidBanchoTokenException(
-                "No bancho session token provided."
-            )
+        self.__check_token()
+        self.sequence += 1
+        sequence = self.sequence
 
         async with self.http.post(self.url, data=packet, headers= {
             "osu-token": self.token,
         }) as response:
-            if response.status != 200:
-                raise exceptions.InvalidBanchoResponse(
-                    f"Bancho responded with status code {response.status} "
-                    "(expected 200)."
-                )
-            if (token := response.headers.get("cho-token")) \
-                and token != "no":
-                self.token = token
-            else:
-                raise exceptions.RejectedBanchoTokenException
+            self.__update_token(response, sequence)
             return await response.read()
 
+    async def stream(
+        self,
+        packet: ByteLike,
+        wants: Optional[Callable[[int], bool]] = None,
+    ) -> AsyncIterator[PacketContext]:
+        """Sends a written packet buffer to bancho, yielding each packet of
+        the server's response as soon as it has fully arrived.
+
+        Args:
+            packet: The packet buffer to send.
+            wants: An optional predicate taking a raw packet ID. Packets it
+                rejects are skipped without being decoded.
+        """
+
+        self.__check_token()
+        self.sequence += 1
+        sequence = self.sequence
+        size = [0]
+
+        async with self.http.post(self.url, data=packet, headers= {
+            "osu-token": self.token,
+        }) as response:
+            self.__update_token(response, sequence)
+            async for ctx in stream_packets(
+                self.__count_chunks(
+                    response.content.iter_chunked(constants.RESPONSE_CHUNK_SIZE),
+                    size,
+                ),
+                wants,
+            ):
+                yield ctx
+
+        # Only set once complete, so overlapping requests don't mix sizes.
+        self.response_size = size[0]
+
+    @staticmethod
+    async def __count_chunks(
+        chunks: AsyncIterable[bytes],
+        size: list[int],
+    ) -> AsyncIterator[bytes]:
+        """Passes response chunks through, adding their size to `size[0]`."""
+
+        async for chunk in chunks:
+            size[0] += len(chunk)
+            yield chunk
+
+    def __check_token(self) -> None:
+        """Ensures the session has a token to send."""
+
+        if self.token == "no" or not self.token:
+            raise exceptions.InvalidBanchoTokenException(
+                "No bancho session token provided."
+            )
+
+    def __update_token(
+        self,
+        response: Union[aiohttp.ClientResponse, HTTPResponse],
+        sequence: int,
+    ) -> None:
+        """Validates a bancho response and stores its rotated token, unless
+        a later request's response has already rotated it."""
+
+        if response.status != 200:
+            raise exceptions.InvalidBanchoResponse(
+                f"Bancho responded with status code {response.status} "
+                "(expected 200)."
+            )
+        if not (token := response.headers.get("cho-token")) \
+            or token == "no":
+            raise exceptions.RejectedBanchoTokenException
+        if sequence > self.token_sequence:
+            self.token = token
+            self.token_sequence = sequence
+
 @dataclass
 class TargetServer:
     """A class representing the domains of the target server."""
@@ -128,34 +244,86 @@ class HWIDInfo:
 class ServerState:
     """A class representing the known state of the server."""
 
-    presences: list[PlayerPresence] = field(default_factory=list)
+    # Presences indexed by user ID.
+    presences: dict[int, PlayerPresence] = field(default_factory=dict)
+    # IDs of every online user, as sent by the last presence bundle.
+    online_user_ids: Sequence[int] = field(default_factory=lambda: array.array("i"))
+    # Case-folded usernames to the ID of the user last seen with them.
+    _names: dict[str, int] = field(default_factory=dict, repr=False)
+    # Case-folded usernames held by several online users (eg. while one is
+    # renamed) to their IDs.
+    _shared_names: dict[str, set[int]] = field(default_factory=dict, repr=False)
 
     def __len__(self) -> int:
         return len(self.presences)
 
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self.presences
+
+    def __iter__(self) -> Iterator[PlayerPresence]:
+        return iter(self.presences.values())
+
     @property
     def player_count(self) -> int:
         """Returns the number of players currently online."""
         return len(self.presences)
 
     def add_presence(self, presence: PlayerPresence) -> None:
-        """Adds a presence to the server state."""
+        """Adds a presence to the server state, replacing the user's
+        existing presence if they have one."""
+
+        previous = self.presences.get(presence.id)
+        if previous is not None and previous.name != presence.name:
+            self.__forget_name(previous)
+
+        self.presences[presence.id] = presence
+        name = presence.name.casefold()
+        holder = self._names.get(name)
+        if holder is not None and holder != presence.id:
+            self._shared_names.setdefault(name, {holder}).add(presence.id)
+        self._names[name] = presence.id
+
+    def read_presence(self, reader: PacketReader) -> None:
+        """Reads the body of a user presence packet into the server state."""
+        self.add_presence(PlayerPresence.from_reader(reader))
 
-        # Check if its in
-        for i, p in enumerate(self.presences):
-            if p.id == presence.id:
-                return
-        self.presences.append(presence)
-    
     def remove_presence(self, user_id: int) -> bool:
         """Removes a presence from the server state, returning a bool of
         whether it was successful."""
 
-        for p in self.presences:
-            if p.id == user_id:
-                self.presences.remove(p)
-                return True
-        return False
+        presence = self.presences.pop(user_id, None)
+        if presence is None:
+            return False
+        self.__forget_name(presence)
+        return True
+
+    def __forget_name(self, presence: PlayerPresence) -> None:
+        name = presence.name.casefold()
+        holders = self._shared_names.get(name)
+        if holders is None:
+            if self._names.get(name) == presence.id:
+                del self._names[name]
+            return
+
+        # Fall back to another user with the same name.
+        holders.discard(presence.id)
+        if self._names[name] == presence.id:
+            self._names[name] = next(iter(holders))
+        if len(holders) == 1:
+            del self._shared_names[name]
+
+    def get_presence(self, user_id: int) -> Optional[PlayerPresence]:
+        """Returns the presence of a user by their ID, if known."""
+        return self.presences.get(user_id)
+
+    def get_presence_by_name(self, name: str) -> Optional[PlayerPresence]:
+        """Returns the presence of a user by their username (ignoring
+        case), if known."""
+
+        user_id = self._names.get(name.casefold())
+        if user_id is None:
+            return None
+        return self.presences.get(user_id)
 
 @dataclass
 class BanchoClient:
@@ -165,10 +333,11 @@ class BanchoClient:
     user_id: int
     username: Optional[str]
     allow_dms: bool
+    friends: Sequence[int]
 
     # Bancho stuff
     session: Optional[BanchoSession]
-    queue: bytearray
+    queue: OutboundQueue
     protocol_version: int
     privileges: constants.Privileges
     server: Optional[TargetServer]
@@ -176,50 +345,95 @@ class BanchoClient:
     hwid: Optional[HWIDInfo]
 
     # Server State
-    server_state: ServerState
+    server_state: Union[ServerState, PlayerTable]
 
-    http: Optional[aiohttp.ClientSession]
+    http: Optional[HTTPClient]
 
     # Packet Stuff
     send_timeout: int
-    _packet_handlers: dict[PacketID, Callable[[PacketContext], Awaitable[None]]]
-    _loop_task: Optional[asyncio.Task]
+    # The most requests allowed in flight at once. Only raise this for
+    # servers which accept overlapping requests from a session.
+    max_in_flight: int
+    scheduler: PollScheduler
+    _wakeup: Optional[asyncio.Event]
+    _wheel: Optional[TimerWheel]
+    _dispatcher: PacketDispatcher
+    _streams: list[PacketStream]
+    _replies: ReplyTable
+    _loop_task: Optional[asyncio.Future]
+    _flush_task: Optional[asyncio.Task]
+    _pending_flush: Optional[asyncio.Future]
+    _in_flight: Optional[asyncio.Semaphore]
+    # The future of the last pipelined request, which the next one's
+    # response is handled after.
+    _last_flush: Optional[asyncio.Future]
 
     # Private Methods
     def __setup_http(self) -> None:
-        """Sets up the aiohttp client session."""
-        self.http = aiohttp.ClientSession(
-            skip_auto_headers=["User-Agent"],
-            headers={"User-Agent": "osu!"}
-        )
+        """Sets up the aiohttp client session, if one has not been set."""
+        if self.http is None:
+            self.http = create_http_session()
     
     def __setup_handlers(self) -> None:
         """Sets up the packet handlers"""
 
-        self._packet_handlers |= {
-            PacketID.SRV_LOGIN_REPLY: self.__packet_login_reply,
-            PacketID.SRV_PROTOCOL_VERSION: self.__packet_protocol_ver,
-            PacketID.SRV_USER_PRESENCE: self.__packet_user_presence,
-            PacketID.SRV_USER_LOGOUT: self.__packet_user_logout,
-        }
-    async def __handle_response(self, response: bytes) -> None:
-        """Handles a response from the server."""
-
-        ctxs = PacketContext.create_from_buffers(response)
-        for ctx in ctxs:
-            packet_handler = self._packet_handlers.get(ctx.id)
-            if not packet_handler:
-                continue
-            await packet_handler(ctx)
+        for packet_id, handler in (
+            (PacketID.SRV_LOGIN_REPLY, self.__packet_login_reply),
+            (PacketID.SRV_PROTOCOL_VERSION, self.__packet_protocol_ver),
+            (PacketID.SRV_USER_PRESENCE, self.__packet_user_presence),
+            (PacketID.SRV_USER_LOGOUT, self.__packet_user_logout),
+            (PacketID.SRV_USER_PRESENCE_BUNDLE, self.__packet_presence_bundle),
+            (PacketID.SRV_FRIENDS_LIST, self.__packet_friends_list),
+        ):
+            self._dispatcher.register(packet_id, handler)
+    async def __handle_response(
+        self,
+        response: AsyncIterable[PacketContext],
+    ) -> None:
+        """Handles a response from the server, dispatching each packet as
+        soon as it arrives."""
+
+        dispatch = self._dispatcher.dispatch
+        async for ctx in response:
+            await dispatch(ctx)
     
     async def __ping_loop(self) -> None:
-        """A function meant to be ran as a task that sends the buffer at
-        regular intervals."""
+        """A function meant to be ran as a task that polls the server at
+        intervals chosen by the client's `PollScheduler`."""
+
+        assert self._wakeup is not None
+        wakeup = self._wakeup
+        scheduler = self.scheduler
 
         while self.connected:
-            self.enqueue(builders.heartbeat())
-            await self.send()
-            await asyncio.sleep(self.send_timeout)
+            # Sleep until the interval passes or a packet is enqueued.
+            try:
+                await asyncio.wait_for(wakeup.wait(), scheduler.interval)
+                immediate = True
+            except asyncio.TimeoutError:
+                immediate = False
+
+            if immediate:
+                # Give packets enqueued alongside this one a chance to join
+                # the same request.
+                await asyncio.sleep(scheduler.coalesce_window)
+            wakeup.clear()
+            if not self.connected:
+                break
+            if immediate and not self.queue:
+                # Already flushed elsewhere (eg. by `send`).
+                continue
+
+            await asyncio.shield(self.poll(immediate))
+
+    def __wake(self) -> None:
+        """Wakes the ping loop or timer wheel (if running) to flush the
+        queue early."""
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        elif self._wheel is not None:
+            self._wheel.wake(self)
     
     # Packet Handlers
     async def __packet_login_reply(self, ctx: PacketContext) -> None:
@@ -237,8 +451,7 @@ class BanchoClient:
     async def __packet_user_presence(self, ctx: PacketContext) -> None:
         """Handles the user presence packet."""
 
-        presence = PlayerPresence.from_reader(ctx.reader)
-        self.server_state.add_presence(presence)
+        self.server_state.read_presence(ctx.reader)
     
     async def __packet_user_logout(self, ctx: PacketContext) -> None:
         """Handles the user logout packet."""
@@ -246,11 +459,28 @@ class BanchoClient:
         user_id = ctx.reader.read_i32()
         self.server_state.remove_presence(user_id)
 
+    async def __packet_presence_bundle(self, ctx: PacketContext) -> None:
+        """Handles the user presence bundle packet, storing the online user
+        IDs as a single array."""
+
+        self.server_state.online_user_ids = ctx.reader.read_i32_list()
+
+    async def __packet_friends_list(self, ctx: PacketContext) -> None:
+        """Handles the friends list packet."""
+
+        self.friends = ctx.reader.read_i32_list()
+
     # Properties
     @property
     def connected(self) -> bool:
         """Checks if the client is currently connected to bancho."""
         return self.session is not None and self.user_id > 0
+
+    @property
+    def unknown_packets(self) -> int:
+        """Returns the number of received packets with IDs unknown to
+        `PacketID`, which have been skipped."""
+        return self._dispatcher.unknown_packets
     
     # Public Methods
     def set_hwid(self, hwid: HWIDInfo) -> "BanchoClient":
@@ -268,14 +498,57 @@ class BanchoClient:
         self.server = server
         return self
     
-    def set_http(self, http: aiohttp.ClientSession) -> "BanchoClient":
-        """Sets the aiohttp client session."""
+    def set_http(self, http: HTTPClient) -> "BanchoClient":
+        """Sets the HTTP client (an aiohttp client session or an
+        `HTTPTransport`)."""
         self.http = http
         return self
     
     def set_send_interval(self, interval: int) -> "BanchoClient":
-        """Sets the interval at which packets are sent (in seconds)."""
+        """Sets the longest interval between polls while idle (in seconds)."""
         self.send_timeout = interval
+        self.scheduler.max_interval = interval
+        return self
+
+    def set_dispatch_mode(
+        self,
+        mode: DispatchMode,
+        max_concurrency: int = 64,
+        executor: Optional[Executor] = None,
+    ) -> "BanchoClient":
+        """Sets how packet handlers are ran.
+
+        Args:
+            mode: Whether handlers run one after another (the default), in
+                the background in order per packet ID, or in the background
+                in no particular order.
+            max_concurrency: The most handlers ran at once in the
+                background modes.
+            executor: A thread or process pool to run plain function
+                handlers on, keeping CPU-bound handlers off the event loop.
+        """
+        self._dispatcher.configure(mode, max_concurrency, executor)
+        return self
+
+    def set_max_in_flight(self, max_in_flight: int) -> "BanchoClient":
+        """Sets the most requests allowed in flight at once. Responses are
+        still handled in the order their requests were sent.
+
+        Note:
+            Overlapping requests are sent with the same token, so this should
+            only be raised for servers which tolerate it. It may be changed
+            while requests are in flight; later requests are ordered after
+            them.
+        """
+        assert max_in_flight >= 1, "At least one request must be allowed."
+        self.max_in_flight = max_in_flight
+        self._in_flight = None
+        return self
+
+    def set_scheduler(self, scheduler: PollScheduler) -> "BanchoClient":
+        """Sets the scheduler choosing the interval between polls."""
+        self.scheduler = scheduler
+        self.send_timeout = scheduler.max_interval
         return self
 
     async def connect(
@@ -302,7 +575,8 @@ class BanchoClient:
         assert self.server is not None, "You must set the server before connecting."
         assert self.version is not None, "You must set the version before connecting."
         assert self.hwid is not None, "You must set the hwid before connecting."
-        assert self.http is not None, "You must set up the HTTP client before connecting."
+        self.__setup_http()
+        assert self.http is not None
 
         self.username = username
 
@@ -336,9 +610,13 @@ class BanchoClient:
             token = response.headers.get("cho-token")
             if token == "no" or token is None:
                 return False
-            # Read the response.
-            response_body = await response.read()
-            await self.__handle_response(response_body)
+            # Handle the response as it streams in.
+            await self.__handle_response(stream_packets(
+                response.content.iter_chunked(constants.RESPONSE_CHUNK_SIZE),
+                self._dispatcher.wants,
+            ))
+            # The login reply may be handled in the background.
+            await self._dispatcher.drain()
 
             # Create sesson if we succeeded.
             if self.user_id > 0:
@@ -357,7 +635,8 @@ class BanchoClient:
         self.server = server or self.server
 
         assert self.server is not None, "You must set the server before connecting."
-        assert self.http is not None, "You must set up the HTTP client before connecting."
+        self.__setup_http()
+        assert self.http is not None
 
         self.user_id = user_id
         self.username = username
@@ -366,22 +645,209 @@ class BanchoClient:
         )
 
     def enqueue(self, data: ByteLike) -> None:
-        """Manually enqueues a packet to be sent to the server."""
-        self.queue.extend(data)
+        """Manually enqueues a packet to be sent to the server.
+
+        Note:
+            `bytes` packets are queued by reference rather than copied, so
+            broadcasting one packet to many clients shares its buffer.
+        """
+        self.queue.append(data)
+        self.__wake()
+
+    def enqueue_builder(
+        self,
+        builder: Callable[..., ByteLike],
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        """Enqueues a packet by having a builder from `packets.builders`
+        write it in place at the end of the queue.
+
+        Example:
+            `client.enqueue_builder(builders.send_message_packet, "hi", "#osu")`
+
+        Note:
+            If the builder raises, anything it wrote to the queue is removed.
+        """
+        buf = self.queue.writable()
+        start = len(buf)
+        try:
+            builder(*args, buf=buf, **kwargs)
+        except BaseException:
+            del buf[start:]
+            raise
+        self.__wake()
     
-    async def send(self) -> None:
-        """Sends the entire enqueued buffer to the server."""
+    def flush(self) -> asyncio.Future:
+        """Schedules the enqueued buffer to be sent to the server, returning
+        a future resolved once everything enqueued so far has been
+        acknowledged by the server. The future's result is the size of the
+        server's response (in bytes).
+
+        Note:
+            At most `max_in_flight` requests (one by default) are in flight
+            at a time. Calls made while no more may be sent are merged into
+            a single follow-up request.
+        """
+        assert self.session is not None, "You must be connected to send packets."
+
+        if self._pending_flush is None:
+            loop = asyncio.get_event_loop()
+            self._pending_flush = loop.create_future()
+            if self._flush_task is None:
+                self._flush_task = loop.create_task(self.__flush_worker())
+        return self._pending_flush
+
+    async def __flush_worker(self) -> None:
+        """Sends the queue for as long as flushes are pending."""
+
+        try:
+            while (future := self._pending_flush) is not None:
+                pipelined = self.max_in_flight > 1
+                if pipelined:
+                    if self._in_flight is None:
+                        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+                    slots = self._in_flight
+                    await slots.acquire()
+                elif (last := self._last_flush) is not None and not last.done():
+                    # Pipelined requests sent before `max_in_flight` was
+                    # lowered may still be in flight; wait for them so
+                    # responses are still handled in order.
+                    await asyncio.wait((last,))
+
+                self._pending_flush = None
+
+                # Swap in a fresh queue so packets enqueued while the
+                # request is in flight are kept for the next one.
+                queue, self.queue = self.queue, OutboundQueue()
+                if pipelined:
+                    previous, self._last_flush = self._last_flush, future
+                    asyncio.get_event_loop().create_task(
+                        self.__send_pipelined(queue, future, previous, slots),
+                    )
+                    continue
+
+                await self.__complete(future, self.__send_queue(queue))
+        finally:
+            self._flush_task = None
+
+    async def __send_pipelined(
+        self,
+        queue: OutboundQueue,
+        future: asyncio.Future,
+        previous: Optional[asyncio.Future],
+        slots: asyncio.Semaphore,
+    ) -> None:
+        """Sends a queue alongside other requests in flight, releasing its
+        slot once the response has been handled."""
+
+        try:
+            await self.__complete(future, self.__send_queue(queue, previous))
+        finally:
+            slots.release()
+
+    @staticmethod
+    async def __complete(future: asyncio.Future, send: Awaitable[int]) -> None:
+        """Resolves a flush future with the outcome of a send."""
+
+        try:
+            response_size = await send
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(response_size)
+
+    async def __send_queue(
+        self,
+        queue: OutboundQueue,
+        previous: Optional[asyncio.Future] = None,
+    ) -> int:
+        """Posts a queue to the server and handles the response, returning
+        the response's size.
+
+        Args:
+            queue: The queue to send.
+            previous: The flush future of the request sent before this one,
+                if it may still be in flight. This response is only handled
+                once the previous one has been.
+        """
         assert self.session is not None, "You must be connected to send packets."
 
-        resp = await self.session.send(self.queue)
-        await self.__handle_response(resp)
-        self.queue.clear()
+        session = self.session
+        response = session.stream(queue.join(), self._dispatcher.wants)
+        if previous is not None and not previous.done():
+            response = self.__after(response, previous)
+        await self.__handle_response(response)
+        return session.response_size
+
+    @staticmethod
+    async def __after(
+        response: AsyncIterable[PacketContext],
+        previous: asyncio.Future,
+    ) -> AsyncIterator[PacketContext]:
+        """Starts a request immediately, but holds back its packets until
+        the previous request's response has been handled."""
+
+        packets = response.__aiter__()
+        try:
+            first = await packets.__anext__()
+        except StopAsyncIteration:
+            await asyncio.wait((previous,))
+            return
+
+        await asyncio.wait((previous,))
+        yield first
+        async for ctx in packets:
+            yield ctx
+
+    def poll(self, immediate: bool = False) -> asyncio.Future:
+        """Flushes the queue, adding a heartbeat if it is empty, and records
+        the outcome with the client's scheduler. Returns the flush future.
+
+        Args:
+            immediate: Whether the poll was triggered by enqueued packets
+                rather than the scheduled interval passing.
+        """
+
+        idle = not self.queue
+        if idle:
+            self.queue.append(builders.heartbeat())
+
+        def record(future: asyncio.Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                self.scheduler.record_poll(future.result(), immediate, idle)
+
+        future = self.flush()
+        future.add_done_callback(record)
+        return future
+
+    async def send(self) -> None:
+        """Sends the entire enqueued buffer to the server, waiting for the
+        server's response to be handled."""
+        await asyncio.shield(self.flush())
     
-    def start_loop(self) -> asyncio.Task:
-        """Starts the ping loop on a new task."""
+    def start_loop(self, wheel: Optional[TimerWheel] = None) -> asyncio.Future:
+        """Starts polling the server, returning a future resolved once the
+        client disconnects.
+
+        Args:
+            wheel: A timer wheel shared with other clients to poll on. If not
+                provided, the ping loop is ran on a new task.
+        """
         assert self.connected, "You must be connected to start the loop."
         self.loop = asyncio.get_event_loop()
-        self._loop_task = self.loop.create_task(self.__ping_loop())
+
+        # Reset both, as a previous connection may have polled differently.
+        if wheel is not None:
+            self._wakeup = None
+            self._wheel = wheel
+            self._loop_task = wheel.add(self)
+        else:
+            self._wheel = None
+            self._wakeup = asyncio.Event()
+            self._loop_task = self.loop.create_task(self.__ping_loop())
         return self._loop_task
     
     async def logout(self, close_http: bool = False) -> None:
@@ -397,15 +863,90 @@ class BanchoClient:
 
         assert self.connected, "You must be connected to logout."
         self.enqueue(builders.logout())
+        # self.connected is now False, so no polls follow the logout.
+        self.user_id = 0
         await self.send()
 
-        self.user_id = 0 # self.connected is now False
         self.session = None
+        for stream in self._streams:
+            stream.close()
+        self._streams.clear()
+        self._replies.cancel_all()
 
         if close_http and self.http is not None:
             await self.http.close()
             self.http = None
     
+    def stream(
+        self,
+        ids: Optional[Iterable[int]] = None,
+        maxsize: int = 1024,
+        policy: OverflowPolicy = OverflowPolicy.BLOCK,
+        key: Optional[Callable[[PacketContext], Hashable]] = None,
+    ) -> PacketStream:
+        """Returns an async iterator over received packets, buffering up to
+        `maxsize` of them for the consumer. The stream stops once closed or
+        the client logs out.
+
+        Args:
+            ids: The raw packet IDs to receive. If not provided, every
+                packet is received.
+            maxsize: The most packets buffered at once.
+            policy: Whether packets received while full wait for room
+                (holding up polling) or drop the oldest packet, or whether
+                packets always replace the buffered packet with the same
+                `key`.
+            key: The key packets are coalesced by with
+                `OverflowPolicy.COALESCE`. Defaults to the raw packet ID.
+        """
+
+        self._streams = [stream for stream in self._streams if not stream.closed]
+        stream = PacketStream(self._dispatcher, ids, maxsize, policy, key)
+        self._streams.append(stream)
+        return stream
+
+    async def request(
+        self,
+        packet: ByteLike,
+        expect: Iterable[int],
+        timeout: Optional[float] = 10.0,
+        key: Optional[Hashable] = None,
+    ) -> PacketContext:
+        """Sends a packet straight away and waits for the server's reply,
+        returning the reply's context.
+
+        Example:
+            `await client.request(builders.join_channel("#osu"), {PacketID.SRV_CHANNEL_JOIN_SUCCESS}, key="#osu")`
+
+        Args:
+            packet: The packet to send.
+            expect: The raw packet IDs of the possible replies (eg. the
+                success and failure replies).
+            timeout: How long to wait for a reply (in seconds) before
+                raising `asyncio.TimeoutError`, or None to wait forever.
+            key: If provided, replies with a key reader in
+                `replies.REPLY_KEYS` (such as the user ID of user stats) only
+                match the request if their key matches it.
+        """
+        assert self.session is not None, "You must be connected to send packets."
+
+        reply = self._replies.expect(expect, key)
+
+        def forward_error(flush: asyncio.Future) -> None:
+            if flush.cancelled() or reply.done():
+                return
+            if (e := flush.exception()) is not None:
+                reply.set_exception(e)
+
+        self.queue.append(packet)
+        self.flush().add_done_callback(forward_error)
+        return await asyncio.wait_for(reply, timeout)
+
+    async def drain_handlers(self) -> None:
+        """Waits for every packet handler running in the background (see
+        `set_dispatch_mode`) to finish."""
+        await self._dispatcher.drain()
+
     async def wait_forever(self) -> None:
         """Waits until the client is disconnected."""
         assert self._loop_task is not None, "You must stuck the loop before running forever."
@@ -425,44 +966,112 @@ class BanchoClient:
     #    """Sets the osu client to the latest version on peppy's api."""
 
     # Decorators
-    def on_packet(self, packet_id: PacketID) -> Callable:
-        """A decorator registering a specific function to a packet handler,
-        overriding the default handler."""
+    def on_packet(self, packet_id: int, priority: int = 0) -> Callable:
+        """A decorator registering a specific function as a handler for a
+        packet, alongside the default handler and any others.
+
+        Note:
+            `packet_id` may be any raw packet ID, including ones unknown to
+            `PacketID`. The handler may be a coroutine function or a plain
+            function (see `set_dispatch_mode`).
+
+        Args:
+            packet_id: The raw packet ID to handle.
+            priority: Handlers with higher priorities run first. Handlers
+                of equal priority (such as the default handlers, which have
+                a priority of 0) run in the order they were registered.
+        """
+        def decorator(func: Callable) -> Callable:
+            self._dispatcher.register(packet_id, func, priority)
+            return func
+        return decorator
+
+    def on_any_packet(self, priority: int = 0) -> Callable:
+        """A decorator registering a specific function as a handler for
+        every packet received.
+
+        Note:
+            Registering one means every packet is decoded and dispatched,
+            rather than only those with handlers.
+        """
         def decorator(func: Callable) -> Callable:
-            # TODO: maybe support multiple handlers per packet?
-            self._packet_handlers[packet_id] = func
+            self._dispatcher.register_all(func, priority)
             return func
         return decorator
 
+    def middleware(self, func: Middleware) -> Middleware:
+        """A decorator registering a function wrapping the handlers of every
+        packet. It is called with the packet context and a coroutine
+        function running the packet's handlers, which it may skip.
+
+        Example:
+            ```
+            @client.middleware
+            async def log(ctx, handle):
+                print(ctx.id)
+                await handle(ctx)
+            ```
+        """
+        self._dispatcher.use(func)
+        return func
+
+    def remove_handler(self, packet_id: Optional[int], func: Callable) -> bool:
+        """Removes a handler registered through `on_packet` (or
+        `on_any_packet` if `packet_id` is None), returning whether it was
+        registered."""
+        return self._dispatcher.unregister(packet_id, func)
+
     # Static Methods
     @staticmethod
     def new(
         version: Optional[OsuVersion] = None,
         hwid: Optional[HWIDInfo] = None,
         allow_dms: bool = True,
+        http: Optional[HTTPClient] = None,
+        server_state: Optional[Union[ServerState, PlayerTable]] = None,
     ) -> "BanchoClient":
-        """Creates a new instance of `BanchoClient`."""
+        """Creates a new instance of `BanchoClient`.
+
+        Args:
+            http: An HTTP client (an aiohttp client session or an
+                `HTTPTransport`) to share with other clients. If not
+                provided, the client creates its own when connecting.
+            server_state: The store of the server's state to use (eg. a
+                `PlayerTable` to track many users compactly). Defaults to a
+                new `ServerState`.
+        """
 
+        dispatcher = PacketDispatcher()
         client = BanchoClient(
             user_id=0,
             username=None,
             allow_dms=allow_dms,
+            friends=array.array("i"),
             session=None,
-            queue=bytearray(),
+            queue=OutboundQueue(),
             protocol_version=0,
             privileges=constants.Privileges(0),
             server=None,
             version=version,
             hwid=hwid,
-            server_state=ServerState(),
-            http=None,
+            server_state=server_state if server_state is not None else ServerState(),
+            http=http,
 
             send_timeout= 5,
-            _packet_handlers={},
+            max_in_flight=1,
+            scheduler=PollScheduler(max_interval=5),
+            _wakeup=None,
+            _wheel=None,
+            _dispatcher=dispatcher,
+            _streams=[],
+            _replies=ReplyTable(dispatcher),
             _loop_task=None,
+            _flush_task=None,
+            _pending_flush=None,
+            _in_flight=None,
+            _last_flush=None,
         )
 
-        client.__setup_http()
         client.__setup_handlers()
 
         return client
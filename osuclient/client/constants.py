@@ -1,5 +1,8 @@
 from enum import IntFlag
 
+# The size of the chunks bancho responses are read and framed in.
+RESPONSE_CHUNK_SIZE = 16 * 1024
+
 class Privileges(IntFlag):
     NORMAL = 1 << 0
     MOD = 1 << 1
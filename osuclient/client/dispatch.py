@@ -0,0 +1,404 @@
+from concurrent.futures import Executor
+from enum import Enum
+from functools import partial
+from typing import (
+    Awaitable,
+    Callable,
+    NamedTuple,
+    Optional,
+    Union,
+)
+import asyncio
+import inspect
+
+from osuclient.packets.constants import PacketID
+from osuclient.packets.rw import PacketContext
+
+PacketHandler = Callable[[PacketContext], Awaitable[None]]
+# A plain function handling a packet, which may be ran in an executor.
+SyncPacketHandler = Callable[[PacketContext], None]
+# Wraps the handlers of a packet, calling the second argument to run them.
+Middleware = Callable[[PacketContext, PacketHandler], Awaitable[None]]
+
+# Raw IDs of every packet known to `PacketID`.
+KNOWN_PACKET_IDS = frozenset(packet_id.value for packet_id in PacketID)
+
+class DispatchMode(Enum):
+    """How a dispatcher runs the handlers of consecutive packets."""
+
+    # Each handler completes before the next packet is dispatched.
+    SEQUENTIAL = 0
+    # Handlers run in the background, in order for packets of the same ID
+    # but concurrently across IDs.
+    ORDERED = 1
+    # Handlers run in the background in no particular order.
+    CONCURRENT = 2
+
+class _Registration(NamedTuple):
+    priority: int
+    order: int
+    handler: PacketHandler
+    # The handler as registered, before any wrapping.
+    original: Callable
+
+class PacketDispatcher:
+    """A flat table of packet handlers indexed by the raw packet ID.
+
+    Each packet ID may have any number of handlers, ran from the highest
+    priority to the lowest (and in registration order for equal priorities),
+    alongside handlers registered for every packet and a chain of
+    middleware. These are compiled into a single callable per packet ID
+    whenever registrations change, so dispatching costs one table lookup.
+
+    Note:
+        Packet IDs unknown to `PacketID` (eg. ones sent by a newer server)
+        are counted and skipped rather than raising, unless handled by a
+        handler registered for every packet.
+
+        In the background modes, at most `max_concurrency` handlers run at
+        once, after which dispatching waits for one to finish. Exceptions
+        raised by background handlers are re-raised by the next `dispatch`
+        or `drain`.
+    """
+
+    __slots__ = (
+        "_handlers",
+        "_registered",
+        "_wildcard",
+        "_middleware",
+        "_fallback",
+        "_order",
+        "unknown_packets",
+        "mode",
+        "max_concurrency",
+        "executor",
+        "_slots",
+        "_tasks",
+        "_tails",
+        "_error",
+    )
+
+    def __init__(
+        self,
+        mode: DispatchMode = DispatchMode.SEQUENTIAL,
+        max_concurrency: int = 64,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Creates a dispatcher.
+
+        Args:
+            mode: How the handlers of consecutive packets are ran.
+            max_concurrency: The most handlers ran at once in the background
+                modes.
+            executor: A thread or process pool to run plain function
+                handlers on. If not provided, they are called directly.
+        """
+
+        # Compiled handlers indexed by raw packet ID.
+        self._handlers: list[Optional[PacketHandler]] = [None] * (max(PacketID) + 1)
+        self._registered: dict[int, list[_Registration]] = {}
+        self._wildcard: list[_Registration] = []
+        self._middleware: list[Middleware] = []
+        # Compiled handlers for packet IDs beyond the table.
+        self._fallback: Optional[PacketHandler] = None
+        self._order = 0
+        self.unknown_packets = 0
+        self.mode = mode
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: set[asyncio.Task] = set()
+        # The last task started for each raw packet ID in `ORDERED` mode.
+        self._tails: dict[int, asyncio.Task] = {}
+        self._error: Optional[BaseException] = None
+
+    def configure(
+        self,
+        mode: DispatchMode,
+        max_concurrency: int = 64,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Changes how handlers are ran. Must not be called while handlers
+        are running in the background."""
+
+        assert not self._tasks, "Handlers are still running in the background."
+        self.mode = mode
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        self._slots = None
+
+    def register(
+        self,
+        packet_id: int,
+        handler: Union[PacketHandler, SyncPacketHandler],
+        priority: int = 0,
+    ) -> None:
+        """Registers a handler for a raw packet ID alongside any existing
+        handlers for it.
+
+        Note:
+            Plain functions are ran on the dispatcher's executor if it has
+            one. Handlers ran on a process pool receive a copy of the packet
+            context, so must be picklable module level functions.
+
+        Args:
+            packet_id: The raw packet ID to handle.
+            handler: The handler to register.
+            priority: Handlers with higher priorities run first.
+        """
+
+        self._registered.setdefault(packet_id, []).append(
+            self.__registration(handler, priority),
+        )
+        if packet_id >= len(self._handlers):
+            self._handlers.extend(
+                [self._fallback] * (packet_id + 1 - len(self._handlers)),
+            )
+        self.__rebuild(packet_id)
+
+    def register_all(
+        self,
+        handler: Union[PacketHandler, SyncPacketHandler],
+        priority: int = 0,
+    ) -> None:
+        """Registers a handler for every packet, including packets with IDs
+        unknown to `PacketID`."""
+
+        self._wildcard.append(self.__registration(handler, priority))
+        self.__rebuild_all()
+
+    def unregister(self, packet_id: Optional[int], handler: Callable) -> bool:
+        """Removes a handler, returning whether it was registered.
+
+        Args:
+            packet_id: The raw packet ID it was registered for, or None if
+                it was registered for every packet.
+            handler: The handler as it was registered.
+        """
+
+        if packet_id is None:
+            registrations = self._wildcard
+        else:
+            registrations = self._registered.get(packet_id, [])
+
+        for registration in registrations:
+            if registration.original is handler:
+                registrations.remove(registration)
+                break
+        else:
+            return False
+
+        if packet_id is None:
+            self.__rebuild_all()
+        else:
+            self.__rebuild(packet_id)
+        return True
+
+    def use(self, middleware: Middleware) -> None:
+        """Adds a middleware wrapping the handlers of every packet. The
+        first middleware added is the outermost.
+
+        Note:
+            Middleware only runs for packets which have handlers, and may
+            skip them by not calling the handler it is given. Anything it
+            reads from the packet is rewound before the handlers run.
+        """
+
+        self._middleware.append(middleware)
+        self.__rebuild_all()
+
+    def __registration(
+        self,
+        handler: Union[PacketHandler, SyncPacketHandler],
+        priority: int,
+    ) -> _Registration:
+        self._order += 1
+        # Includes objects with an async `__call__`.
+        is_async = asyncio.iscoroutinefunction(handler) \
+            or asyncio.iscoroutinefunction(getattr(handler, "__call__", None))
+        wrapped = handler if is_async else self.__wrap_sync(handler)
+        return _Registration(priority, self._order, wrapped, handler)
+
+    def __compile(
+        self,
+        registrations: list[_Registration],
+    ) -> Optional[PacketHandler]:
+        """Compiles registrations into a single callable running each
+        handler in turn within the middleware chain."""
+
+        if not registrations:
+            return None
+
+        handlers = tuple(
+            registration.handler for registration in sorted(
+                registrations, key=lambda r: (-r.priority, r.order),
+            )
+        )
+        run = handlers[0] if len(handlers) == 1 else self.__chain(handlers)
+        for middleware in reversed(self._middleware):
+            run = self.__wrap_middleware(middleware, run)
+        return run
+
+    @staticmethod
+    def __chain(handlers: tuple[PacketHandler, ...]) -> PacketHandler:
+        """Creates a handler running several handlers one after another,
+        each reading the packet from the start."""
+
+        async def run(ctx: PacketContext) -> None:
+            reader = ctx.reader
+            start = reader.position
+            for handler in handlers:
+                reader.position = start
+                await handler(ctx)
+        return run
+
+    @staticmethod
+    def __wrap_middleware(
+        middleware: Middleware,
+        handler: PacketHandler,
+    ) -> PacketHandler:
+        async def run(ctx: PacketContext) -> None:
+            reader = ctx.reader
+            start = reader.position
+
+            # Rewinds anything the middleware read before running the
+            # handlers.
+            async def call(inner: PacketContext) -> None:
+                if inner.reader is reader:
+                    reader.position = start
+                await handler(inner)
+
+            await middleware(ctx, call)
+        return run
+
+    def __rebuild(self, packet_id: int) -> None:
+        self._handlers[packet_id] = self.__compile(
+            self._registered.get(packet_id, []) + self._wildcard,
+        )
+
+    def __rebuild_all(self) -> None:
+        self._fallback = self.__compile(self._wildcard)
+        for packet_id in range(len(self._handlers)):
+            self.__rebuild(packet_id)
+
+    def __wrap_sync(self, handler: SyncPacketHandler) -> PacketHandler:
+        """Wraps a plain function handler into a coroutine function.
+
+        Note:
+            Handlers returning an awaitable (eg. a lambda returning a
+            coroutine) have it awaited, unless they were ran in the executor.
+        """
+
+        async def run(ctx: PacketContext) -> None:
+            if self.executor is None:
+                result = handler(ctx)
+                if inspect.isawaitable(result):
+                    await result
+                return
+
+            result = await asyncio.get_event_loop().run_in_executor(
+                self.executor, handler, ctx,
+            )
+            if inspect.isawaitable(result):
+                if inspect.iscoroutine(result):
+                    result.close()
+                raise TypeError(
+                    f"Handler {handler!r} returned an awaitable when ran in "
+                    "an executor. Define it with `async def` to run it on "
+                    "the event loop instead."
+                )
+        return run
+
+    def get(self, packet_id: int) -> Optional[PacketHandler]:
+        """Returns the compiled handler for a raw packet ID, if it has any
+        handlers."""
+
+        if packet_id < len(self._handlers):
+            return self._handlers[packet_id]
+        return self._fallback
+
+    def wants(self, packet_id: int) -> bool:
+        """Checks whether a raw packet ID has a handler, counting IDs that
+        are unknown to `PacketID`."""
+
+        if packet_id < len(self._handlers):
+            if self._handlers[packet_id] is not None:
+                return True
+        elif self._fallback is not None:
+            return True
+        if packet_id not in KNOWN_PACKET_IDS:
+            self.unknown_packets += 1
+        return False
+
+    @property
+    def running(self) -> int:
+        """Returns the number of handlers running in the background."""
+        return len(self._tasks)
+
+    async def dispatch(self, ctx: PacketContext) -> None:
+        """Dispatches a packet to its handler, if one is registered."""
+
+        if self._error is not None:
+            self.__raise_error()
+
+        handler = self.get(ctx.raw_id)
+        if handler is None:
+            return
+        if self.mode is DispatchMode.SEQUENTIAL:
+            await handler(ctx)
+            return
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        await self._slots.acquire()
+
+        loop = asyncio.get_event_loop()
+        if self.mode is DispatchMode.ORDERED:
+            previous = self._tails.get(ctx.raw_id)
+            task = loop.create_task(self.__run_after(handler, ctx, previous))
+            self._tails[ctx.raw_id] = task
+            task.add_done_callback(partial(self.__tail_done, ctx.raw_id))
+        else:
+            task = loop.create_task(handler(ctx))
+
+        self._tasks.add(task)
+        task.add_done_callback(self.__task_done)
+
+    @staticmethod
+    async def __run_after(
+        handler: PacketHandler,
+        ctx: PacketContext,
+        previous: Optional[asyncio.Task],
+    ) -> None:
+        """Runs a handler once the previous packet of its ID is handled."""
+
+        if previous is not None:
+            await asyncio.wait((previous,))
+        await handler(ctx)
+
+    def __task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        assert self._slots is not None
+        self._slots.release()
+
+        if not task.cancelled() and (e := task.exception()) is not None \
+            and self._error is None:
+            self._error = e
+
+    def __tail_done(self, raw_id: int, task: asyncio.Task) -> None:
+        # Only the last task for an ID is kept as its tail.
+        if self._tails.get(raw_id) is task:
+            del self._tails[raw_id]
+
+    def __raise_error(self) -> None:
+        error, self._error = self._error, None
+        assert error is not None
+        raise error
+
+    async def drain(self) -> None:
+        """Waits for every handler running in the background to finish."""
+
+        while self._tasks:
+            await asyncio.wait(tuple(self._tasks))
+        if self._error is not None:
+            self.__raise_error()
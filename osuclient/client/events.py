@@ -0,0 +1,216 @@
+from collections import (
+    OrderedDict,
+    deque,
+)
+from enum import Enum
+from typing import (
+    Callable,
+    Hashable,
+    Iterable,
+    Optional,
+    Union,
+)
+import asyncio
+
+from osuclient.packets.rw import PacketContext
+from .dispatch import PacketDispatcher
+
+class OverflowPolicy(Enum):
+    """How a `PacketStream` keeps its buffer within its size."""
+
+    # Wait for the consumer to make room while full, holding up the client's
+    # polling.
+    BLOCK = 0
+    # Discard the oldest buffered packet while full.
+    DROP_OLDEST = 1
+    # Always replace the buffered packet with the same key (see
+    # `PacketStream`), even while not full, so only the latest packet per key
+    # is buffered. While full, a packet with a new key discards the oldest
+    # buffered packet.
+    COALESCE = 2
+
+class PacketStream:
+    """An async iterator over the packets received by a client, buffered in
+    a bounded queue so they may be consumed at the consumer's own pace.
+
+    Example:
+        ```
+        async for ctx in client.stream(ids=(PacketID.SRV_SEND_MESSAGE,)):
+            print(ctx.reader.read_str())
+        ```
+    """
+
+    __slots__ = (
+        "maxsize",
+        "policy",
+        "key",
+        "received",
+        "dropped",
+        "coalesced",
+        "_buffer",
+        "_getter",
+        "_putters",
+        "_closed",
+        "_dispatcher",
+        "_ids",
+        "_handler",
+    )
+
+    def __init__(
+        self,
+        dispatcher: PacketDispatcher,
+        ids: Optional[Iterable[int]] = None,
+        maxsize: int = 1024,
+        policy: OverflowPolicy = OverflowPolicy.BLOCK,
+        key: Optional[Callable[[PacketContext], Hashable]] = None,
+        priority: int = 0,
+    ) -> None:
+        """Creates a stream, registering it with a dispatcher.
+
+        Args:
+            dispatcher: The dispatcher to receive packets from.
+            ids: The raw packet IDs to receive. If not provided, every
+                packet is received.
+            maxsize: The most packets buffered at once.
+            policy: What to do with packets received while full.
+            key: The key packets are coalesced by with `COALESCE`, read
+                from the packet's context. Defaults to the raw packet ID.
+            priority: The priority of the stream's handler.
+        """
+
+        assert maxsize > 0, "The stream must be able to buffer a packet."
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.key = key or (lambda ctx: ctx.raw_id)
+        self.received = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._buffer: Union[deque[PacketContext], OrderedDict[Hashable, PacketContext]] = \
+            OrderedDict() if policy is OverflowPolicy.COALESCE else deque()
+        self._getter: Optional[asyncio.Future] = None
+        self._putters: deque[asyncio.Future] = deque()
+        self._closed = False
+        self._dispatcher = dispatcher
+        self._ids = tuple(ids) if ids is not None else None
+
+        # Kept to unregister the same bound method later.
+        self._handler = self.__put
+        if self._ids is None:
+            dispatcher.register_all(self._handler, priority)
+        else:
+            for packet_id in self._ids:
+                dispatcher.register(packet_id, self._handler, priority)
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def closed(self) -> bool:
+        """Returns whether the stream has been closed."""
+        return self._closed
+
+    @property
+    def drop_rate(self) -> float:
+        """Returns the fraction of received packets which were discarded,
+        either dropped while full (`dropped`) or, with `COALESCE`, replaced
+        by a later packet with the same key at any fill level
+        (`coalesced`)."""
+
+        if not self.received:
+            return 0.0
+        return (self.dropped + self.coalesced) / self.received
+
+    async def __put(self, ctx: PacketContext) -> None:
+        """Buffers a packet, applying the overflow policy if full."""
+
+        if self._closed:
+            return
+        self.received += 1
+        # Other handlers may go on to read the original context.
+        ctx = ctx.copy()
+
+        if self.policy is OverflowPolicy.COALESCE:
+            self.__put_coalesced(ctx)
+        else:
+            buffer = self._buffer
+            assert isinstance(buffer, deque)
+            while len(buffer) >= self.maxsize:
+                if self.policy is OverflowPolicy.DROP_OLDEST:
+                    buffer.popleft()
+                    self.dropped += 1
+                    continue
+
+                putter = asyncio.get_event_loop().create_future()
+                self._putters.append(putter)
+                await putter
+                if self._closed:
+                    return
+            buffer.append(ctx)
+
+        if (getter := self._getter) is not None:
+            self._getter = None
+            if not getter.done():
+                getter.set_result(None)
+
+    def __put_coalesced(self, ctx: PacketContext) -> None:
+        buffer = self._buffer
+        assert isinstance(buffer, OrderedDict)
+
+        key = self.key(ctx.copy())
+        if key in buffer:
+            self.coalesced += 1
+        elif len(buffer) >= self.maxsize:
+            buffer.popitem(last=False)
+            self.dropped += 1
+        buffer[key] = ctx
+
+    def __aiter__(self) -> "PacketStream":
+        return self
+
+    async def __anext__(self) -> PacketContext:
+        buffer = self._buffer
+        while not buffer:
+            if self._closed:
+                raise StopAsyncIteration
+            self._getter = asyncio.get_event_loop().create_future()
+            await self._getter
+
+        if isinstance(buffer, OrderedDict):
+            ctx = buffer.popitem(last=False)[1]
+        else:
+            ctx = buffer.popleft()
+
+        # Let a blocked poll loop buffer its packet.
+        while self._putters:
+            putter = self._putters.popleft()
+            if not putter.done():
+                putter.set_result(None)
+                break
+        return ctx
+
+    async def __aenter__(self) -> "PacketStream":
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stops receiving packets. Packets already buffered may still be
+        iterated over, after which iteration stops."""
+
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._ids is None:
+            self._dispatcher.unregister(None, self._handler)
+        else:
+            for packet_id in self._ids:
+                self._dispatcher.unregister(packet_id, self._handler)
+
+        for waiter in (self._getter, *self._putters):
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+        self._getter = None
+        self._putters.clear()
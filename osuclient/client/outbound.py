@@ -0,0 +1,73 @@
+from typing import Optional
+
+from osuclient.packets.rw import ByteLike
+
+class OutboundQueue:
+    """A queue of packets waiting to be sent to the server, kept as a list of
+    buffer segments.
+
+    Note:
+        Immutable `bytes` packets are stored by reference, so the same packet
+        enqueued to many clients shares a single buffer. Mutable buffers are
+        copied into a writable tail segment, which builders may also write
+        into in place. Segments are only joined once, when flushed.
+    """
+
+    __slots__ = (
+        "_segments",
+        "_tail",
+        "_size",
+    )
+
+    def __init__(self) -> None:
+        self._segments: list[ByteLike] = []
+        self._tail: Optional[bytearray] = None
+        self._size = 0 # Excluding the open tail.
+
+    def __len__(self) -> int:
+        if self._tail is None:
+            return self._size
+        return self._size + len(self._tail)
+
+    @property
+    def segments(self) -> tuple[ByteLike, ...]:
+        """Returns the buffer segments making up the queue."""
+        return tuple(self._segments)
+
+    def __close_tail(self) -> None:
+        if self._tail is not None:
+            self._size += len(self._tail)
+            self._tail = None
+
+    def writable(self) -> bytearray:
+        """Returns a bytearray at the end of the queue which packets may be
+        appended to in place (eg. through a builder's `buf` argument)."""
+
+        if self._tail is None:
+            self._tail = bytearray()
+            self._segments.append(self._tail)
+        return self._tail
+
+    def append(self, data: ByteLike) -> None:
+        """Appends a packet buffer to the queue."""
+
+        if isinstance(data, bytes):
+            self.__close_tail()
+            self._segments.append(data)
+            self._size += len(data)
+        else:
+            self.writable().extend(data)
+
+    def join(self) -> bytes:
+        """Joins all segments into a single buffer."""
+
+        if len(self._segments) == 1 and isinstance(self._segments[0], bytes):
+            return self._segments[0]
+        return b"".join(self._segments)
+
+    def clear(self) -> None:
+        """Removes all segments from the queue."""
+
+        self._segments = []
+        self._tail = None
+        self._size = 0
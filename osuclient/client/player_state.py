@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 
 from osuclient.packets import rw
+from osuclient.packets import schema
+from osuclient.packets.constants import PacketID
 from .constants import Privileges
 
 @dataclass
@@ -16,13 +18,14 @@ class PlayerPresence:
 
     @staticmethod
     def from_reader(reader: rw.PacketReader) -> "PlayerPresence":
+        fields = schema.decode(PacketID.SRV_USER_PRESENCE, reader)
         return PlayerPresence(
-            id= reader.read_i32(),
-            name= reader.read_str(),
-            time_offset= reader.read_u8() - 24,
-            country= reader.read_u8(),
-            bancho_priv= Privileges(reader.read_u8()),
-            lat= reader.read_f32(),
-            lon= reader.read_f32(),
-            rank= reader.read_i32(),
+            id= fields.user_id,
+            name= fields.name,
+            time_offset= fields.utc_offset - 24,
+            country= fields.country,
+            bancho_priv= Privileges(fields.bancho_priv),
+            lat= fields.lat,
+            lon= fields.lon,
+            rank= fields.rank,
         )
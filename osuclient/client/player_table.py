@@ -0,0 +1,499 @@
+"""A columnar alternative to `ServerState` for tracking many users.
+
+Presence fields are kept in parallel typed columns (NumPy arrays when NumPy
+is installed, `array.array` otherwise) rather than one object per user.
+Usernames are kept UTF-8 encoded in a single buffer, and rows are indexed by
+user ID and username in open addressing tables of row numbers, so no Python
+objects are kept per user.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+)
+import array
+
+from osuclient.packets import schema
+from osuclient.packets.constants import PacketID
+from osuclient.packets.rw import PacketReader
+from .constants import Privileges
+from .player_state import PlayerPresence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = (
+    "PlayerTable",
+    "PresenceView",
+)
+
+# (name, array typecode, NumPy dtype)
+COLUMNS = (
+    ("id", "i", "<i4"),
+    ("time_offset", "h", "<i2"),
+    ("country", "B", "u1"),
+    ("bancho_priv", "B", "u1"),
+    ("lat", "f", "<f4"),
+    ("lon", "f", "<f4"),
+    ("rank", "i", "<i4"),
+    # The UTF-8 encoded username, in the table's name buffer.
+    ("name_start", "I", "<u4"),
+    ("name_length", "H", "<u2"),
+    # The hash of the case-folded username.
+    ("name_hash", "q", "<i8"),
+)
+_INITIAL_CAPACITY = 64
+# Bytes of removed names the name buffer may hold before it is compacted.
+_MIN_NAME_GARBAGE = 4096
+
+_EMPTY = -1
+_DELETED = -2
+
+Column = Union[array.array, "numpy.ndarray"]
+
+# 2^64 divided by the golden ratio, for Fibonacci hashing.
+_FIBONACCI = 0x9E3779B97F4A7C15
+_U64_MASK = (1 << 64) - 1
+
+def _first_slot(value: int, mask: int) -> int:
+    """Returns the slot a key's probes start at in a table of `mask + 1`
+    slots (a power of two), taken from the high bits of the key multiplied
+    by a large odd constant so keys sharing their low bits (eg. user IDs
+    which are multiples of 1024) are spread out rather than clustered."""
+    return ((value * _FIBONACCI) & _U64_MASK) >> (64 - mask.bit_length())
+
+class _RowIndex:
+    """An open addressing hash table of rows by the value of one of the
+    table's integer columns, storing only the row numbers."""
+
+    __slots__ = (
+        "_columns",
+        "_key",
+        "_slots",
+        "_used",
+        "_filled",
+    )
+
+    def __init__(self, columns: dict[str, Column], key: str) -> None:
+        self._columns = columns
+        self._key = key
+        self._slots = array.array("i", (_EMPTY,)) * 8
+        self._used = 0
+        # Used slots, including deleted ones.
+        self._filled = 0
+
+    def find(self, value: int, start: int = 0) -> tuple[int, int]:
+        """Returns the first row with the key `value` from the `start`th
+        probe onwards, and the probe after it. The row is -1 if not found."""
+
+        slots = self._slots
+        column = self._columns[self._key]
+        mask = len(slots) - 1
+        first = _first_slot(value, mask)
+        probe = start
+        while True:
+            row = slots[(first + probe) & mask]
+            probe += 1
+            if row == _EMPTY:
+                return _EMPTY, probe
+            if row != _DELETED and column[row] == value:
+                return row, probe
+
+    def add(self, value: int, row: int) -> None:
+        """Adds a row with the key `value`."""
+
+        if (self._filled + 1) * 3 > len(self._slots) * 2:
+            self.__rebuild()
+        self.__insert(self._slots, value, row)
+
+    def __insert(self, slots: array.array, value: int, row: int) -> None:
+        mask = len(slots) - 1
+        probe = _first_slot(value, mask)
+        while slots[probe & mask] >= 0:
+            probe += 1
+        if slots[probe & mask] == _EMPTY:
+            self._filled += 1
+        slots[probe & mask] = row
+        self._used += 1
+
+    def remove(self, value: int, row: int) -> None:
+        """Removes a row with the key `value`, if present."""
+
+        slots = self._slots
+        mask = len(slots) - 1
+        probe = _first_slot(value, mask)
+        while (current := slots[probe & mask]) != _EMPTY:
+            if current == row:
+                slots[probe & mask] = _DELETED
+                self._used -= 1
+                return
+            probe += 1
+
+    def __rebuild(self) -> None:
+        """Re-inserts every row into enough slots to be at most half full,
+        clearing deleted slots."""
+
+        column = self._columns[self._key]
+        capacity = 8
+        while capacity < (self._used + 1) * 2:
+            capacity *= 2
+
+        slots = array.array("i", (_EMPTY,)) * capacity
+        rows = [row for row in self._slots if row >= 0]
+        self._used = self._filled = 0
+        for row in rows:
+            self.__insert(slots, int(column[row]), row)
+        self._slots = slots
+
+class PresenceView:
+    """A lightweight view of a user's row in a `PlayerTable`, exposing the
+    same fields as `PlayerPresence`.
+
+    Note:
+        Views read the table on access, so reflect later updates. A view of
+        a removed user must not be used, as its row may be reused.
+    """
+
+    __slots__ = (
+        "_table",
+        "_row",
+    )
+
+    def __init__(self, table: PlayerTable, row: int) -> None:
+        self._table = table
+        self._row = row
+
+    def __repr__(self) -> str:
+        return f"PresenceView(id={self.id}, name={self.name!r})"
+
+    @property
+    def id(self) -> int:
+        return int(self._table._columns["id"][self._row])
+
+    @property
+    def name(self) -> str:
+        return self._table._name(self._row)
+
+    @property
+    def time_offset(self) -> int:
+        return int(self._table._columns["time_offset"][self._row])
+
+    @property
+    def country(self) -> int:
+        return int(self._table._columns["country"][self._row])
+
+    @property
+    def bancho_priv(self) -> Privileges:
+        return Privileges(int(self._table._columns["bancho_priv"][self._row]))
+
+    @property
+    def lat(self) -> float:
+        return float(self._table._columns["lat"][self._row])
+
+    @property
+    def lon(self) -> float:
+        return float(self._table._columns["lon"][self._row])
+
+    @property
+    def rank(self) -> int:
+        return int(self._table._columns["rank"][self._row])
+
+    def to_presence(self) -> PlayerPresence:
+        """Copies the row into a standalone `PlayerPresence`."""
+
+        return PlayerPresence(
+            id= self.id,
+            name= self.name,
+            time_offset= self.time_offset,
+            country= self.country,
+            bancho_priv= self.bancho_priv,
+            lat= self.lat,
+            lon= self.lon,
+            rank= self.rank,
+        )
+
+class _PresenceMapping(Mapping):
+    """A read-only mapping of user IDs to views of their rows."""
+
+    __slots__ = ("_table",)
+
+    def __init__(self, table: PlayerTable) -> None:
+        self._table = table
+
+    def __getitem__(self, user_id: int) -> PresenceView:
+        if (view := self._table.get_presence(user_id)) is None:
+            raise KeyError(user_id)
+        return view
+
+    def __iter__(self) -> Iterator[int]:
+        for view in self._table:
+            yield view.id
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+class PlayerTable:
+    """A columnar store of the known state of the server, usable in place of
+    `ServerState` (see `BanchoClient.new`).
+
+    Note:
+        Rows of removed users are kept on a free list and reused, with their
+        ID set to 0. Filter on the `id` column when using `column`.
+    """
+
+    __slots__ = (
+        "online_user_ids",
+        "_columns",
+        "_ids",
+        "_name_hashes",
+        "_name_data",
+        "_name_garbage",
+        "_free",
+        "_size",
+        "_capacity",
+        "_use_numpy",
+    )
+
+    def __init__(self, use_numpy: bool = True) -> None:
+        """Creates an empty table.
+
+        Args:
+            use_numpy: Whether to store columns as NumPy arrays. Ignored if
+                NumPy is not installed.
+        """
+
+        # IDs of every online user, as sent by the last presence bundle.
+        self.online_user_ids: Sequence[int] = array.array("i")
+        self._use_numpy = use_numpy and numpy is not None
+        self._columns: dict[str, Column] = {}
+        self._ids = _RowIndex(self._columns, "id")
+        self._name_hashes = _RowIndex(self._columns, "name_hash")
+        # The UTF-8 encoded usernames of every row.
+        self._name_data = bytearray()
+        self._name_garbage = 0
+        self._free = array.array("i")
+        self._size = 0 # Rows in use, including free ones.
+        self._capacity = 0
+        self.__grow(_INITIAL_CAPACITY)
+
+    def __grow(self, capacity: int) -> None:
+        """Grows every column to hold `capacity` rows."""
+
+        for name, typecode, dtype in COLUMNS:
+            if self._use_numpy:
+                column = numpy.zeros(capacity, dtype=dtype)
+                if name in self._columns:
+                    column[:self._capacity] = self._columns[name]
+            else:
+                column = self._columns.get(name, array.array(typecode))
+                column.frombytes(bytes((capacity - self._capacity) * column.itemsize))
+            self._columns[name] = column
+        self._capacity = capacity
+
+    def __len__(self) -> int:
+        return self._ids._used
+
+    def __contains__(self, user_id: object) -> bool:
+        return isinstance(user_id, int) and self.__row_of(user_id) != _EMPTY
+
+    def __iter__(self) -> Iterator[PresenceView]:
+        for row in self.__live_rows():
+            yield PresenceView(self, row)
+
+    def __live_rows(self) -> Iterator[int]:
+        ids = self._columns["id"]
+        for row in range(self._size):
+            if ids[row]:
+                yield row
+
+    def __row_of(self, user_id: int) -> int:
+        return self._ids.find(user_id)[0]
+
+    @property
+    def presences(self) -> Mapping[int, PresenceView]:
+        """Returns a read-only mapping of user IDs to views of their
+        presences."""
+        return _PresenceMapping(self)
+
+    @property
+    def player_count(self) -> int:
+        """Returns the number of players currently online."""
+        return len(self)
+
+    def column(self, name: str) -> Column:
+        """Returns a column of the table, over every row in use (including
+        free rows, whose `id` is 0).
+
+        Note:
+            With NumPy, this is a view which may be invalidated by the table
+            growing. Otherwise, it is a copy.
+        """
+
+        return self._columns[name][:self._size]
+
+    def _name(self, row: int) -> str:
+        start = int(self._columns["name_start"][row])
+        length = int(self._columns["name_length"][row])
+        return self._name_data[start:start + length].decode()
+
+    def __set_name(self, row: int, name: str, new: bool) -> None:
+        """Writes a row's username, indexing it by its case-folded hash.
+        Rows in use are always indexed (even with an empty username), so
+        an existing row's previous name is removed first."""
+
+        columns = self._columns
+        encoded = name.encode()
+        if not new:
+            start = int(columns["name_start"][row])
+            length = int(columns["name_length"][row])
+            if self._name_data[start:start + length] == encoded:
+                return
+            self.__forget_name(row)
+
+        columns["name_start"][row] = len(self._name_data)
+        columns["name_length"][row] = len(encoded)
+        self._name_data += encoded
+
+        name_hash = hash(name.casefold())
+        columns["name_hash"][row] = name_hash
+        self._name_hashes.add(name_hash, row)
+
+    def __forget_name(self, row: int) -> None:
+        """Removes a row's username from the index, compacting the name
+        buffer if enough of it is no longer used."""
+
+        columns = self._columns
+        self._name_hashes.remove(int(columns["name_hash"][row]), row)
+        length = int(columns["name_length"][row])
+        columns["name_length"][row] = 0
+        self._name_garbage += length
+        if (
+            self._name_garbage > _MIN_NAME_GARBAGE
+            and self._name_garbage * 2 > len(self._name_data)
+        ):
+            self.__compact_names()
+
+    def __compact_names(self) -> None:
+        starts = self._columns["name_start"]
+        lengths = self._columns["name_length"]
+        data = self._name_data
+        compacted = bytearray()
+        for row in range(self._size):
+            if length := int(lengths[row]):
+                start = int(starts[row])
+                starts[row] = len(compacted)
+                compacted += data[start:start + length]
+        self._name_data = compacted
+        self._name_garbage = 0
+
+    def __set_row(
+        self,
+        user_id: int,
+        name: str,
+        time_offset: int,
+        country: int,
+        bancho_priv: int,
+        lat: float,
+        lon: float,
+        rank: int,
+    ) -> None:
+        """Writes a user's presence into their row, allocating one if they
+        don't have one."""
+
+        columns = self._columns
+        row = self.__row_of(user_id)
+        new = row == _EMPTY
+        if new:
+            if self._free:
+                row = self._free.pop()
+            else:
+                if self._size == self._capacity:
+                    self.__grow(self._capacity * 2)
+                    columns = self._columns
+                row = self._size
+                self._size += 1
+            columns["id"][row] = user_id
+            self._ids.add(user_id, row)
+
+        columns["time_offset"][row] = time_offset
+        columns["country"][row] = country
+        columns["bancho_priv"][row] = bancho_priv
+        columns["lat"][row] = lat
+        columns["lon"][row] = lon
+        columns["rank"][row] = rank
+        self.__set_name(row, name, new)
+
+    def add_presence(self, presence: Union[PlayerPresence, PresenceView]) -> None:
+        """Adds a presence to the table, replacing the user's existing
+        presence if they have one."""
+
+        self.__set_row(
+            presence.id,
+            presence.name,
+            presence.time_offset,
+            presence.country,
+            int(presence.bancho_priv),
+            presence.lat,
+            presence.lon,
+            presence.rank,
+        )
+
+    def read_presence(self, reader: PacketReader) -> None:
+        """Reads the body of a user presence packet straight into the
+        table."""
+
+        fields: Any = schema.decode(PacketID.SRV_USER_PRESENCE, reader)
+        self.__set_row(
+            fields.user_id,
+            fields.name,
+            fields.utc_offset - 24,
+            fields.country,
+            fields.bancho_priv,
+            fields.lat,
+            fields.lon,
+            fields.rank,
+        )
+
+    def remove_presence(self, user_id: int) -> bool:
+        """Removes a presence from the table, returning a bool of whether it
+        was successful."""
+
+        row = self.__row_of(user_id)
+        if row == _EMPTY:
+            return False
+
+        self._ids.remove(user_id, row)
+        self.__forget_name(row)
+        self._columns["id"][row] = 0
+        self._free.append(row)
+        return True
+
+    def get_presence(self, user_id: int) -> Optional[PresenceView]:
+        """Returns a view of a user's presence by their ID, if known."""
+
+        row = self.__row_of(user_id)
+        if row == _EMPTY:
+            return None
+        return PresenceView(self, row)
+
+    def get_presence_by_name(self, name: str) -> Optional[PresenceView]:
+        """Returns a view of a user's presence by their username (ignoring
+        case), if known."""
+
+        folded = name.casefold()
+        name_hash = hash(folded)
+        row, probe = self._name_hashes.find(name_hash)
+        # Rows with different names may share a hash.
+        while row != _EMPTY:
+            if self._name(row).casefold() == folded:
+                return PresenceView(self, row)
+            row, probe = self._name_hashes.find(name_hash, probe)
+        return None
@@ -0,0 +1,135 @@
+from typing import (
+    Optional,
+    Union,
+)
+import aiohttp
+import asyncio
+
+from .bancho import (
+    BanchoClient,
+    HWIDInfo,
+    OsuVersion,
+    ServerState,
+    create_http_session,
+)
+from .player_table import PlayerTable
+from .transport import (
+    HTTPClient,
+    HTTPTransport,
+)
+
+class ClientPool:
+    """A factory for clients sharing a single HTTP client and its
+    connections, so connections, DNS lookups and TLS sessions to the server
+    are reused across every client rather than set up per client.
+
+    Note:
+        The pool owns the shared HTTP client. Clients created by it must not be
+        logged out with `close_http=True`; close the pool instead.
+    """
+
+    __slots__ = (
+        "clients",
+        "raw_transport",
+        "_connector_kwargs",
+        "_http",
+    )
+
+    def __init__(
+        self,
+        limit: int = 0,
+        limit_per_host: int = 512,
+        keepalive_timeout: float = 30.0,
+        ttl_dns_cache: Optional[int] = 300,
+        raw_transport: bool = False,
+    ) -> None:
+        """Creates a client pool.
+
+        Args:
+            limit: The maximum number of open connections (0 for no limit).
+            limit_per_host: The maximum number of open connections to a
+                single host (0 for no limit). Requests beyond it wait for a
+                connection to be released.
+            keepalive_timeout: How long idle connections are kept open
+                (in seconds).
+            ttl_dns_cache: How long resolved addresses are cached
+                (in seconds, or None to cache them forever).
+            raw_transport: Whether to share a lightweight `HTTPTransport`
+                rather than an aiohttp client session. Only `limit_per_host`
+                applies to it.
+        """
+
+        self.clients: list[BanchoClient] = []
+        self.raw_transport = raw_transport
+        self._connector_kwargs = {
+            "limit": limit,
+            "limit_per_host": limit_per_host,
+            "keepalive_timeout": keepalive_timeout,
+            "ttl_dns_cache": ttl_dns_cache,
+        }
+        self._http: Optional[HTTPClient] = None
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    async def __aenter__(self) -> "ClientPool":
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+    @property
+    def http(self) -> HTTPClient:
+        """Returns the shared HTTP client, creating it on first use."""
+
+        if self._http is None and self.raw_transport:
+            self._http = HTTPTransport(
+                limit_per_host=self._connector_kwargs["limit_per_host"],
+            )
+        elif self._http is None:
+            self._http = create_http_session(
+                aiohttp.TCPConnector(**self._connector_kwargs),
+            )
+        return self._http
+
+    def new(
+        self,
+        version: Optional[OsuVersion] = None,
+        hwid: Optional[HWIDInfo] = None,
+        allow_dms: bool = True,
+        server_state: Optional[Union[ServerState, PlayerTable]] = None,
+    ) -> BanchoClient:
+        """Creates a new client using the pool's shared session.
+
+        Args:
+            server_state: The store of the server's state to use (eg. a
+                `PlayerTable` to track many users compactly). Defaults to a
+                new `ServerState`.
+        """
+
+        client = BanchoClient.new(
+            version=version,
+            hwid=hwid,
+            allow_dms=allow_dms,
+            http=self.http,
+            server_state=server_state,
+        )
+        self.clients.append(client)
+        return client
+
+    async def close(self, logout: bool = True) -> None:
+        """Closes the shared HTTP client.
+
+        Args:
+            logout: Whether to log out every connected client first.
+        """
+
+        if logout:
+            await asyncio.gather(*(
+                client.logout() for client in self.clients if client.connected
+            ), return_exceptions=True)
+        self.clients.clear()
+
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
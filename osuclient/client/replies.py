@@ -0,0 +1,175 @@
+from collections import deque
+from typing import (
+    Callable,
+    Hashable,
+    Iterable,
+    Optional,
+)
+import asyncio
+
+from osuclient.packets.constants import PacketID
+from osuclient.packets.rw import (
+    PacketContext,
+    PacketReader,
+)
+from .dispatch import PacketDispatcher
+
+# Reads the key a reply is matched to its request by, for replies which
+# start with one (eg. the user ID of `SRV_USER_STATS`).
+REPLY_KEYS: dict[int, Callable[[PacketReader], Hashable]] = {
+    PacketID.SRV_USER_STATS: PacketReader.read_i32,
+    PacketID.SRV_USER_PRESENCE: PacketReader.read_i32,
+    PacketID.SRV_CHANNEL_JOIN_SUCCESS: PacketReader.read_str,
+    PacketID.SRV_CHANNEL_INFO: PacketReader.read_str,
+    PacketID.SRV_MATCH_JOIN_SUCCESS: PacketReader.read_u16,
+    PacketID.SRV_NEW_MATCH: PacketReader.read_u16,
+    PacketID.SRV_UPDATE_MATCH: PacketReader.read_u16,
+}
+
+class ReplyTable:
+    """A table of futures waiting for replies from the server, indexed by
+    the raw packet ID (and key, see `REPLY_KEYS`) of the expected reply.
+
+    Note:
+        Futures waiting for the same reply are resolved in the order they
+        were added. The table only has a handler registered with the
+        dispatcher for packet IDs which are being waited for, so other
+        packets may still be skipped without being decoded.
+    """
+
+    __slots__ = (
+        "_waiting",
+        "_keyed",
+        "_keyed_ids",
+        "_dispatcher",
+        "_handler",
+    )
+
+    def __init__(self, dispatcher: PacketDispatcher) -> None:
+        """Creates an empty table.
+
+        Args:
+            dispatcher: The dispatcher to receive replies from.
+        """
+
+        self._waiting: dict[int, deque[asyncio.Future]] = {}
+        self._keyed: dict[tuple[int, Hashable], deque[asyncio.Future]] = {}
+        # The number of keys waited on per raw packet ID.
+        self._keyed_ids: dict[int, int] = {}
+        self._dispatcher = dispatcher
+        # Kept to unregister the same bound method later.
+        self._handler = self.__handle
+
+    def __len__(self) -> int:
+        waiters = (*self._waiting.values(), *self._keyed.values())
+        return len({future for futures in waiters for future in futures})
+
+    def expect(
+        self,
+        packet_ids: Iterable[int],
+        key: Optional[Hashable] = None,
+    ) -> asyncio.Future:
+        """Returns a future resolved with a copy of the context of the first
+        packet received with any of the raw IDs.
+
+        Args:
+            packet_ids: The raw packet IDs of the possible replies.
+            key: If provided, replies with a key reader in `REPLY_KEYS` only
+                resolve the future if their key matches it.
+        """
+
+        future = asyncio.get_event_loop().create_future()
+        locations: list[tuple[dict, Hashable]] = []
+
+        for packet_id in packet_ids:
+            if not self.__waited_for(packet_id):
+                self._dispatcher.register(packet_id, self._handler)
+
+            if key is not None and packet_id in REPLY_KEYS:
+                table, table_key = self._keyed, (packet_id, key)
+                if table_key not in table:
+                    self._keyed_ids[packet_id] = self._keyed_ids.get(packet_id, 0) + 1
+            else:
+                table, table_key = self._waiting, packet_id
+            table.setdefault(table_key, deque()).append(future)
+            locations.append((table, table_key))
+
+        future.add_done_callback(lambda f: self.__remove(f, locations))
+        return future
+
+    def __remove(
+        self,
+        future: asyncio.Future,
+        locations: list[tuple[dict, Hashable]],
+    ) -> None:
+        """Removes a completed future from wherever it is still waiting."""
+
+        for table, table_key in locations:
+            if (futures := table.get(table_key)) is None:
+                continue
+            try:
+                futures.remove(future)
+            except ValueError:
+                pass
+            if not futures:
+                self.__delete(table, table_key)
+
+    def __delete(self, table: dict, table_key: Hashable) -> None:
+        del table[table_key]
+        if table is self._keyed:
+            packet_id = table_key[0]
+            self._keyed_ids[packet_id] -= 1
+            if not self._keyed_ids[packet_id]:
+                del self._keyed_ids[packet_id]
+        else:
+            packet_id = table_key
+
+        if not self.__waited_for(packet_id):
+            self._dispatcher.unregister(packet_id, self._handler)
+
+    def __waited_for(self, packet_id: int) -> bool:
+        return packet_id in self._waiting or packet_id in self._keyed_ids
+
+    async def __handle(self, ctx: PacketContext) -> None:
+        self.resolve(ctx)
+
+    def resolve(self, ctx: PacketContext) -> None:
+        """Resolves the oldest future waiting for a packet, if any."""
+
+        raw_id = ctx.raw_id
+        if (futures := self._waiting.get(raw_id)) is not None:
+            self.__resolve_first(self._waiting, raw_id, futures, ctx)
+
+        if raw_id in self._keyed_ids:
+            key = REPLY_KEYS[raw_id](ctx.copy().reader)
+            table_key = (raw_id, key)
+            if (futures := self._keyed.get(table_key)) is not None:
+                self.__resolve_first(self._keyed, table_key, futures, ctx)
+
+    def __resolve_first(
+        self,
+        table: dict,
+        table_key: Hashable,
+        futures: deque[asyncio.Future],
+        ctx: PacketContext,
+    ) -> None:
+        # Futures completed elsewhere are only removed once their callbacks
+        # run, so may still be waiting here.
+        future = None
+        while futures:
+            future = futures.popleft()
+            if not future.done():
+                break
+            future = None
+
+        if not futures:
+            self.__delete(table, table_key)
+        if future is not None:
+            future.set_result(ctx.copy())
+
+    def cancel_all(self) -> None:
+        """Cancels every waiting future."""
+
+        for futures in (*self._waiting.values(), *self._keyed.values()):
+            for future in tuple(futures):
+                future.cancel()
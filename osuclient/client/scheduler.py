@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+from dataclasses import field
+
+@dataclass
+class PollMetrics:
+    """Counters describing the polls chosen by a `PollScheduler`."""
+
+    polls: int = 0
+    # Polls triggered early by packets being enqueued.
+    immediate_polls: int = 0
+    # Polls which only carried a heartbeat.
+    idle_polls: int = 0
+    # Polls whose response carried data from the server.
+    busy_polls: int = 0
+    last_interval: float = 0.0
+    total_interval: float = 0.0
+
+    @property
+    def mean_interval(self) -> float:
+        """Returns the mean interval chosen between polls (in seconds)."""
+        return self.total_interval / self.polls if self.polls else 0.0
+
+@dataclass
+class PollScheduler:
+    """Chooses how long a client waits between polls of the server.
+
+    Polling speeds up to `min_interval` while the server is pushing data and
+    backs off exponentially towards `max_interval` while it is idle. Enqueued
+    packets are flushed after at most `coalesce_window` regardless.
+    """
+
+    min_interval: float = 0.5
+    max_interval: float = 5.0
+    # How long to wait after a packet is enqueued, coalescing any others
+    # enqueued in the meantime into the same request.
+    coalesce_window: float = 0.005
+    backoff: float = 2.0
+    interval: float = field(init=False)
+    metrics: PollMetrics = field(default_factory=PollMetrics)
+
+    def __post_init__(self) -> None:
+        self.interval = self.min_interval
+
+    def record_poll(
+        self,
+        response_size: int,
+        immediate: bool,
+        idle: bool,
+    ) -> float:
+        """Records the outcome of a poll, returning the interval to wait
+        before the next one.
+
+        Args:
+            response_size: The size of the server's response (in bytes).
+            immediate: Whether the poll was triggered by an enqueued packet.
+            idle: Whether the poll only carried a heartbeat.
+        """
+
+        if response_size:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        metrics = self.metrics
+        metrics.polls += 1
+        metrics.immediate_polls += immediate
+        metrics.idle_polls += idle
+        metrics.busy_polls += response_size > 0
+        metrics.last_interval = self.interval
+        metrics.total_interval += self.interval
+        return self.interval
@@ -0,0 +1,184 @@
+from typing import (
+    TYPE_CHECKING,
+    Optional,
+)
+import asyncio
+import random
+
+if TYPE_CHECKING:
+    from .bancho import BanchoClient
+
+class TimerWheel:
+    """A hashed timer wheel polling many clients from a single task.
+
+    Each client is placed in the slot its next poll is due in, and one
+    driver task advances the wheel every `tick` seconds, polling every client
+    due in the current slot as a batch. The cost of waiting is therefore one
+    timer per tick, however many clients share the wheel.
+
+    Note:
+        Intervals are rounded to the nearest tick, with intervals longer than
+        a full revolution (`tick * size`) taking several revolutions.
+    """
+
+    __slots__ = (
+        "tick",
+        "jitter",
+        "_slots",
+        "_cursor",
+        "_slot_of",
+        "_done",
+        "_task",
+    )
+
+    def __init__(
+        self,
+        tick: float = 0.05,
+        size: int = 512,
+        jitter: float = 0.0,
+    ) -> None:
+        """Creates a timer wheel.
+
+        Args:
+            tick: The length of each slot (in seconds).
+            size: The number of slots in the wheel.
+            jitter: The maximum random delay (in seconds) added to each
+                interval, spreading out clients started at the same time.
+        """
+
+        self.tick = tick
+        self.jitter = jitter
+        # Each slot maps id(client) -> [client, rounds left, immediate].
+        self._slots: list[dict[int, list]] = [{} for _ in range(size)]
+        self._cursor = 0 # The slot fired on the next tick.
+        self._slot_of: dict[int, int] = {}
+        # Futures resolved when a client leaves the wheel.
+        self._done: dict[int, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def add(self, client: "BanchoClient") -> asyncio.Future:
+        """Adds a connected client to the wheel, returning a future resolved
+        once it disconnects (or raised if polling it fails)."""
+
+        key = id(client)
+        assert key not in self._done, "The client is already on this wheel."
+
+        loop = asyncio.get_event_loop()
+        self._done[key] = done = loop.create_future()
+        self.__schedule(client, client.scheduler.interval, False)
+
+        if self._task is None:
+            self._task = loop.create_task(self.__run())
+        return done
+
+    def wake(self, client: "BanchoClient") -> None:
+        """Brings a client's next poll forward to its coalescing window,
+        flushing its queue early."""
+
+        key = id(client)
+        if (index := self._slot_of.get(key)) is None:
+            # Not on the wheel or currently polling, in which case its queue
+            # is checked once the poll completes.
+            return
+        if self._slots[index][key][2]:
+            return # Already woken.
+
+        del self._slots[index][key]
+        self.__schedule(client, client.scheduler.coalesce_window, True)
+
+    def __schedule(
+        self,
+        client: "BanchoClient",
+        delay: float,
+        immediate: bool,
+    ) -> None:
+        """Places a client in the slot `delay` seconds from now."""
+
+        if self.jitter and not immediate:
+            delay += random.uniform(0, self.jitter)
+
+        # The slot under the cursor is the one fired on the next tick.
+        ticks = max(round(delay / self.tick), 1) - 1
+        rounds, offset = divmod(ticks, len(self._slots))
+        index = (self._cursor + offset) % len(self._slots)
+
+        key = id(client)
+        self._slots[index][key] = [client, rounds, immediate]
+        self._slot_of[key] = index
+
+    def __advance(self) -> None:
+        """Fires every client due in the current slot and moves the cursor
+        onto the next one."""
+
+        slot = self._slots[self._cursor]
+        self._cursor = (self._cursor + 1) % len(self._slots)
+
+        due = []
+        for key, entry in slot.items():
+            if entry[1]:
+                entry[1] -= 1
+            else:
+                due.append(key)
+
+        for key in due:
+            client, _, immediate = slot.pop(key)
+            del self._slot_of[key]
+            self.__fire(client, immediate)
+
+    def __fire(self, client: "BanchoClient", immediate: bool) -> None:
+        """Starts polling a client, rescheduling it once the poll completes."""
+
+        if not client.connected:
+            self.__finish(client)
+            return
+
+        def reschedule(future: asyncio.Future) -> None:
+            if future.cancelled():
+                self.__finish(client, asyncio.CancelledError())
+            elif (e := future.exception()) is not None:
+                self.__finish(client, e)
+            elif not client.connected:
+                self.__finish(client)
+            elif client.queue:
+                # Packets were enqueued while the poll was in flight.
+                self.__schedule(client, client.scheduler.coalesce_window, True)
+            else:
+                self.__schedule(client, client.scheduler.interval, False)
+
+        client.poll(immediate).add_done_callback(reschedule)
+
+    def __finish(
+        self,
+        client: "BanchoClient",
+        exception: Optional[BaseException] = None,
+    ) -> None:
+        """Removes a client from the wheel, resolving its future."""
+
+        done = self._done.pop(id(client), None)
+        if done is None or done.done():
+            return
+        if exception is None:
+            done.set_result(None)
+        else:
+            done.set_exception(exception)
+
+    async def __run(self) -> None:
+        """Ticks the wheel for as long as it has clients."""
+
+        loop = asyncio.get_event_loop()
+        deadline = loop.time()
+        try:
+            while self._done:
+                deadline += self.tick
+                await asyncio.sleep(max(deadline - loop.time(), 0))
+                self.__advance()
+
+                # Catch up on any ticks missed while the loop was busy.
+                while deadline + self.tick <= loop.time():
+                    deadline += self.tick
+                    self.__advance()
+        finally:
+            self._task = None
@@ -0,0 +1,578 @@
+"""A minimal HTTP/1.1 client for bancho traffic, built directly on
+`asyncio.Protocol`.
+
+Bancho requests are all the same shape (a POST with a handful of headers),
+so this skips most of what a general purpose client does per request. It
+exposes the subset of the aiohttp client interface used by `BanchoSession`
+and `BanchoClient`, so either may be used as a client's `http`.
+"""
+
+from collections import deque
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterator,
+    Optional,
+    Union,
+)
+from urllib.parse import urlsplit
+import aiohttp
+import asyncio
+import ssl
+
+from osuclient.packets.rw import ByteLike
+
+__all__ = (
+    "HTTPTransport",
+    "HTTPResponse",
+    "HTTPClient",
+    "StreamContent",
+)
+
+# How much of a response body may be buffered before reading is paused.
+HIGH_WATER = 256 * 1024
+
+# Parser states.
+_IDLE = 0
+_HEAD = 1
+_BODY = 2 # Content-Length delimited.
+_CHUNK_SIZE = 3
+_CHUNK = 4
+_CHUNK_END = 5
+_TRAILER = 6
+_EOF_BODY = 7 # Delimited by the connection closing.
+
+class Headers(dict):
+    """Response headers, looked up case-insensitively."""
+
+    def __getitem__(self, key: str) -> str:
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and super().__contains__(key.lower())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return super().get(key.lower(), default)
+
+class StreamContent:
+    """A response body as it arrives, read in the same way as aiohttp's
+    `StreamReader`."""
+
+    __slots__ = (
+        "_chunks",
+        "_size",
+        "_eof",
+        "_exception",
+        "_waiter",
+        "_transport",
+        "_paused",
+        "_timeout",
+    )
+
+    def __init__(
+        self,
+        transport: asyncio.Transport,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self._chunks: deque[bytes] = deque()
+        self._size = 0
+        self._eof = False
+        self._exception: Optional[BaseException] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self._transport = transport
+        self._paused = False
+        # How long to wait for more of the body (in seconds).
+        self._timeout = timeout
+
+    def at_eof(self) -> bool:
+        """Checks whether the whole body has been read."""
+        return self._eof and not self._chunks
+
+    def feed_data(self, data: bytes) -> None:
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size > HIGH_WATER and not self._paused:
+            self._paused = True
+            self._transport.pause_reading()
+        self.__wake()
+
+    def feed_eof(self) -> None:
+        self._eof = True
+        self.__wake()
+
+    def set_exception(self, exception: BaseException) -> None:
+        self._exception = exception
+        self.__wake()
+
+    def __wake(self) -> None:
+        if (waiter := self._waiter) is not None:
+            self._waiter = None
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def readany(self) -> bytes:
+        """Reads the next buffered chunk, returning `b""` at the end of the
+        body."""
+
+        while not self._chunks:
+            if self._exception is not None:
+                raise self._exception
+            if self._eof:
+                return b""
+            self._waiter = asyncio.get_event_loop().create_future()
+            try:
+                await asyncio.wait_for(self._waiter, self._timeout)
+            except asyncio.TimeoutError:
+                self._waiter = None
+                raise aiohttp.ServerTimeoutError(
+                    "Timed out waiting for the response body."
+                ) from None
+
+        chunk = self._chunks.popleft()
+        self._size -= len(chunk)
+        if self._paused and self._size <= HIGH_WATER // 2:
+            self._paused = False
+            self._transport.resume_reading()
+        return chunk
+
+    async def iter_chunked(self, n: int) -> AsyncIterator[bytes]:
+        """Iterates over the body in chunks of at most `n` bytes."""
+
+        while chunk := await self.readany():
+            if len(chunk) <= n:
+                yield chunk
+            else:
+                for i in range(0, len(chunk), n):
+                    yield chunk[i:i + n]
+
+    async def read(self) -> bytes:
+        """Reads the rest of the body."""
+
+        chunks = []
+        while chunk := await self.readany():
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+class HTTPResponse:
+    """The status, headers and streamed body of a response."""
+
+    __slots__ = (
+        "status",
+        "reason",
+        "headers",
+        "content",
+    )
+
+    def __init__(
+        self,
+        status: int,
+        reason: str,
+        headers: Headers,
+        content: StreamContent,
+    ) -> None:
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    async def read(self) -> bytes:
+        """Reads the whole response body."""
+        return await self.content.read()
+
+class _HTTPProtocol(asyncio.Protocol):
+    """A keep-alive HTTP/1.1 connection parsing one response at a time."""
+
+    def __init__(self, read_timeout: Optional[float] = None) -> None:
+        self.read_timeout = read_timeout
+        self.transport: Optional[asyncio.Transport] = None
+        self.closed = False
+        # Whether the last response has been fully received and the
+        # connection may be reused.
+        self.reusable = False
+        self._buf = bytearray()
+        self._state = _IDLE
+        self._remaining = 0
+        self._head: Optional[asyncio.Future] = None
+        self._content: Optional[StreamContent] = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.Transport)
+        self.transport = transport
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.closed = True
+        self.reusable = False
+        if self._state == _EOF_BODY:
+            self.__finish()
+            return
+
+        error = ConnectionResetError("The server closed the connection.")
+        if self._head is not None and not self._head.done():
+            self._head.set_exception(error)
+        elif self._state != _IDLE and self._content is not None:
+            self._content.set_exception(error)
+        self._state = _IDLE
+
+    def request(self, data: list[ByteLike]) -> asyncio.Future:
+        """Writes a request, returning a future resolved with its response
+        once the response head has been received."""
+
+        assert self.transport is not None
+        self.reusable = False
+        self._state = _HEAD
+        self._head = asyncio.get_event_loop().create_future()
+        self.transport.writelines(data)
+        return self._head
+
+    def close(self) -> None:
+        self.closed = True
+        self.reusable = False
+        if self.transport is not None:
+            self.transport.close()
+
+    def data_received(self, data: bytes) -> None:
+        # Body data arriving on its own is passed on without a copy.
+        if not self._buf and self._state == _BODY and len(data) <= self._remaining:
+            assert self._content is not None
+            self._content.feed_data(data)
+            self._remaining -= len(data)
+            if not self._remaining:
+                self.__finish()
+            return
+
+        self._buf += data
+        try:
+            self.__parse()
+        except ValueError as e:
+            error = aiohttp.ClientPayloadError(f"Malformed response: {e}")
+            if self._head is not None and not self._head.done():
+                self._head.set_exception(error)
+            elif self._content is not None:
+                self._content.set_exception(error)
+            self.close()
+
+    def __parse(self) -> None:
+        buf = self._buf
+        while buf:
+            state = self._state
+            if state == _HEAD:
+                end = buf.find(b"\r\n\r\n")
+                if end < 0:
+                    return
+                head = bytes(buf[:end])
+                del buf[:end + 4]
+                self.__parse_head(head)
+            elif state == _BODY or state == _CHUNK:
+                assert self._content is not None
+                n = min(self._remaining, len(buf))
+                self._content.feed_data(bytes(buf[:n]))
+                del buf[:n]
+                self._remaining -= n
+                if not self._remaining:
+                    if state == _BODY:
+                        self.__finish()
+                    else:
+                        self._state = _CHUNK_END
+            elif state == _CHUNK_SIZE:
+                end = buf.find(b"\r\n")
+                if end < 0:
+                    return
+                size = int(bytes(buf[:end]).split(b";", 1)[0], 16)
+                del buf[:end + 2]
+                if size:
+                    self._remaining = size
+                    self._state = _CHUNK
+                else:
+                    self._state = _TRAILER
+            elif state == _CHUNK_END:
+                if len(buf) < 2:
+                    return
+                del buf[:2]
+                self._state = _CHUNK_SIZE
+            elif state == _TRAILER:
+                end = buf.find(b"\r\n")
+                if end < 0:
+                    return
+                del buf[:end + 2]
+                if not end:
+                    self.__finish()
+            elif state == _EOF_BODY:
+                assert self._content is not None
+                self._content.feed_data(bytes(buf))
+                buf.clear()
+            else:
+                # Data without a request; the connection can't be trusted.
+                buf.clear()
+                self.close()
+
+    def __parse_head(self, head: bytes) -> None:
+        lines = head.decode("latin-1").split("\r\n")
+        version, status, *reason = lines[0].split(" ", 2)
+        if not version.startswith("HTTP/"):
+            raise ValueError(f"invalid status line {lines[0]!r}")
+
+        headers = Headers()
+        for line in lines[1:]:
+            key, sep, value = line.partition(":")
+            if not sep:
+                raise ValueError(f"invalid header {line!r}")
+            headers[key.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        self.reusable = connection != "close" if version == "HTTP/1.1" \
+            else connection == "keep-alive"
+
+        assert self.transport is not None and self._head is not None
+        self._content = StreamContent(self.transport, self.read_timeout)
+        response = HTTPResponse(
+            int(status), reason[0] if reason else "", headers, self._content,
+        )
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            self._state = _CHUNK_SIZE
+        elif (length := headers.get("content-length")) is not None:
+            self._remaining = int(length)
+            self._state = _BODY
+            if not self._remaining:
+                self.__finish()
+        else:
+            self.reusable = False
+            self._state = _EOF_BODY
+
+        self._head.set_result(response)
+
+    def __finish(self) -> None:
+        """Marks the current response as fully received."""
+
+        self._state = _IDLE
+        if self._content is not None:
+            self._content.feed_eof()
+        if self.reusable and self._buf:
+            # Data beyond the response; the connection can't be trusted.
+            self.reusable = False
+
+    @property
+    def complete(self) -> bool:
+        """Checks whether the current response has been fully received."""
+        return self._state == _IDLE
+
+    @property
+    def consumed(self) -> bool:
+        """Checks whether the current response's body has been fully read.
+        Reading may be paused while it isn't."""
+        return self._content is None or self._content.at_eof()
+
+class _Request:
+    """An async context manager sending a request and yielding its
+    response, in the same way as aiohttp's `ClientSession.post`."""
+
+    __slots__ = (
+        "_http",
+        "_url",
+        "_data",
+        "_headers",
+        "_key",
+        "_protocol",
+    )
+
+    def __init__(
+        self,
+        http: "HTTPTransport",
+        url: str,
+        data: ByteLike,
+        headers: Optional[dict[str, str]],
+    ) -> None:
+        self._http = http
+        self._url = url
+        self._data = data
+        self._headers = headers
+        self._key: Optional[tuple[str, int, bool]] = None
+        self._protocol: Optional[_HTTPProtocol] = None
+
+    async def __aenter__(self) -> HTTPResponse:
+        key, head = self._http._prepare(self._url, self._data, self._headers)
+        if (limit := self._http._limit(key)) is not None:
+            await limit.acquire()
+        self._key = key
+
+        # Not retried if the connection is reset, as the server may have
+        # already processed the request (bancho requests aren't idempotent).
+        try:
+            self._protocol = await self._http._acquire(key)
+            try:
+                return await asyncio.wait_for(
+                    self._protocol.request([head, self._data]),
+                    self._http.read_timeout,
+                )
+            except asyncio.TimeoutError:
+                raise aiohttp.ServerTimeoutError(
+                    "Timed out waiting for the response."
+                ) from None
+        except BaseException:
+            self.__release()
+            raise
+
+    async def __aexit__(self, *_) -> None:
+        self.__release()
+
+    def __release(self) -> None:
+        if self._key is None:
+            return
+        self._http._release(self._key, self._protocol)
+        self._key = None
+        self._protocol = None
+
+class HTTPTransport:
+    """A lightweight HTTP/1.1 client with keep-alive connection pooling,
+    usable in place of an aiohttp client session for bancho traffic.
+
+    Note:
+        Only what bancho requires is supported: POST requests whose
+        responses are either Content-Length delimited, chunked or delimited
+        by the connection closing. Redirects, compression and cookies are
+        not handled.
+    """
+
+    __slots__ = (
+        "limit_per_host",
+        "headers",
+        "read_timeout",
+        "_idle",
+        "_limits",
+        "_urls",
+        "_ssl",
+    )
+
+    def __init__(
+        self,
+        limit_per_host: int = 512,
+        headers: Optional[dict[str, str]] = None,
+        read_timeout: Optional[float] = 60.0,
+    ) -> None:
+        """Creates a transport.
+
+        Args:
+            limit_per_host: The maximum number of requests in flight to a
+                single host (0 for no limit). Requests beyond it wait for
+                one to complete.
+            headers: Headers sent with every request.
+            read_timeout: How long to wait for the response head, and then
+                for each part of the body (in seconds, or None to wait
+                forever). Timing out raises `aiohttp.ServerTimeoutError`.
+        """
+
+        self.limit_per_host = limit_per_host
+        self.headers = headers if headers is not None else {"User-Agent": "osu!"}
+        self.read_timeout = read_timeout
+        self._idle: dict[tuple[str, int, bool], list[_HTTPProtocol]] = {}
+        self._limits: dict[tuple[str, int, bool], asyncio.Semaphore] = {}
+        # URL -> (connection key, encoded request line and static headers).
+        self._urls: dict[str, tuple[tuple[str, int, bool], bytes]] = {}
+        self._ssl: Optional[ssl.SSLContext] = None
+
+    def post(
+        self,
+        url: str,
+        data: ByteLike = b"",
+        headers: Optional[dict[str, str]] = None,
+    ) -> _Request:
+        """Posts `data` to `url`. Use as an async context manager yielding
+        the `HTTPResponse`."""
+        return _Request(self, url, data, headers)
+
+    async def close(self) -> None:
+        """Closes every idle connection."""
+
+        for idle in self._idle.values():
+            for protocol in idle:
+                protocol.close()
+        self._idle.clear()
+
+    def _prepare(
+        self,
+        url: str,
+        data: ByteLike,
+        headers: Optional[dict[str, str]],
+    ) -> tuple[tuple[str, int, bool], bytes]:
+        """Builds the head of a request to `url`."""
+
+        if (cached := self._urls.get(url)) is None:
+            parts = urlsplit(url)
+            https = parts.scheme == "https"
+            host = parts.hostname or ""
+            port = parts.port or (443 if https else 80)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+
+            static = f"POST {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            for key, value in self.headers.items():
+                static += f"{key}: {value}\r\n"
+            cached = self._urls[url] = ((host, port, https), static.encode())
+
+        key, static = cached
+        head = bytearray(static)
+        if headers:
+            for name, value in headers.items():
+                head += f"{name}: {value}\r\n".encode()
+        head += b"Content-Length: %d\r\n\r\n" % len(data)
+        return key, bytes(head)
+
+    def _limit(self, key: tuple[str, int, bool]) -> Optional[asyncio.Semaphore]:
+        """Returns the semaphore limiting requests to a host, if limited."""
+
+        if (limit := self._limits.get(key)) is None and self.limit_per_host > 0:
+            limit = self._limits[key] = asyncio.Semaphore(self.limit_per_host)
+        return limit
+
+    async def _acquire(
+        self,
+        key: tuple[str, int, bool],
+    ) -> _HTTPProtocol:
+        """Returns an open connection to a host, reusing an idle one if
+        possible."""
+
+        idle = self._idle.get(key)
+        while idle:
+            protocol = idle.pop()
+            # Skip connections the server has started closing while idle.
+            transport = protocol.transport
+            if not protocol.closed and transport is not None \
+                and not transport.is_closing():
+                return protocol
+            protocol.close()
+
+        host, port, https = key
+        ssl_context = None
+        if https:
+            if self._ssl is None:
+                self._ssl = ssl.create_default_context()
+            ssl_context = self._ssl
+
+        _, protocol = await asyncio.get_event_loop().create_connection(
+            partial(_HTTPProtocol, self.read_timeout), host, port,
+            ssl=ssl_context,
+        )
+        return protocol
+
+    def _release(
+        self,
+        key: tuple[str, int, bool],
+        protocol: Optional[_HTTPProtocol],
+    ) -> None:
+        """Returns a connection to the pool if its response was fully
+        received and read, closing it otherwise (eg. as reading may have been
+        paused with part of the body left unread)."""
+
+        if (limit := self._limits.get(key)) is not None:
+            limit.release()
+        if protocol is None:
+            return
+        if protocol.complete and protocol.consumed and protocol.reusable \
+            and not protocol.closed:
+            self._idle.setdefault(key, []).append(protocol)
+        else:
+            protocol.close()
+
+# Any HTTP client usable by a `BanchoSession`.
+HTTPClient = Union[aiohttp.ClientSession, HTTPTransport]
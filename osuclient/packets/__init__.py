@@ -1,3 +1,5 @@
 from . import rw
 from . import constants
 from . import builders
+from . import schema
+from . import replay
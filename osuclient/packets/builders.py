@@ -1,33 +1,63 @@
-from .rw import PacketWriter
+from typing import (
+    Optional,
+    Sequence,
+)
+
+from .rw import (
+    PacketTemplate,
+    PacketWriter,
+)
 from .constants import PacketID
+from .replay import (
+    ReplayFrameBundle,
+    encode_frame_bundle,
+)
 
 __all__ = (
     "heartbeat",
     "logout",
 )
 
-def heartbeat() -> bytearray:
+# Pre-serialised packets without any fields.
+HEARTBEAT = bytes(PacketWriter().finish(PacketID.OSU_HEARTBEAT))
+LOGOUT = bytes(PacketWriter().finish(PacketID.OSU_LOGOUT))
+MATCH_READY = bytes(PacketWriter().finish(PacketID.OSU_MATCH_READY))
+MATCH_LOADED = bytes(PacketWriter().finish(PacketID.OSU_MATCH_LOAD_COMPLETE))
+MATCH_NOT_READY = bytes(PacketWriter().finish(PacketID.OSU_MATCH_UNREADY))
+MATCH_SKIP_REQ = bytes(PacketWriter().finish(PacketID.OSU_MATCH_SKIP_REQUEST))
+MATCH_PLAYER_FINISHED_MAP = bytes(PacketWriter().finish(PacketID.OSU_MATCH_COMPLETE))
+MATCH_LEAVE = bytes(PacketWriter().finish(PacketID.OSU_PART_MATCH))
+MATCH_START = bytes(PacketWriter().finish(PacketID.OSU_MATCH_START))
+
+# Templates of fixed layout packets.
+_START_SPECTATING = PacketTemplate(PacketID.OSU_START_SPECTATING, "i")
+_MATCH_INVITE = PacketTemplate(PacketID.OSU_MATCH_INVITE, "i")
+
+def _prebuilt(packet: bytes, buf: Optional[bytearray]) -> bytes:
+    """Returns a pre-serialised packet, or appends it to `buf`."""
+
+    if buf is None:
+        return packet
+    buf += packet
+    return buf
+
+def heartbeat(buf: Optional[bytearray] = None) -> bytes:
     """Writes a heartbeat packet."""
 
-    return (
-        PacketWriter()
-            .finish(PacketID.OSU_HEARTBEAT)
-    )
+    return _prebuilt(HEARTBEAT, buf)
 
-def logout() -> bytearray:
+def logout(buf: Optional[bytearray] = None) -> bytes:
     """Writes a logout packet."""
 
-    return (
-        PacketWriter()
-            .finish(PacketID.OSU_LOGOUT)
-    )
+    return _prebuilt(LOGOUT, buf)
 
 def send_message_packet(
     content: str,
     target: str,
+    buf: Optional[bytearray] = None,
 ) -> bytes:
     return (
-        PacketWriter()
+        PacketWriter(buf)
             .write_str("")
             .write_str(content)
             .write_str(target)
@@ -37,10 +67,11 @@ def send_message_packet(
 def send_private_message_packet(
     content: str,
     target: str,
-    sender_id: int
+    sender_id: int,
+    buf: Optional[bytearray] = None,
 ) -> bytes:
     return (
-        PacketWriter()
+        PacketWriter(buf)
             .write_str("")
             .write_str(content)
             .write_str(target)
@@ -49,13 +80,16 @@ def send_private_message_packet(
     )
 
 def start_spectating(
-    user_id: int
+    user_id: int,
+    buf: Optional[bytearray] = None,
 ) -> bytes:
-    return (
-        PacketWriter()
-            .write_i32(user_id)
-            .finish(PacketID.OSU_START_SPECTATING)
-    )
+    return _START_SPECTATING.build(user_id, buf=buf)
+
+def spectate_frames(
+    bundle: ReplayFrameBundle,
+    buf: Optional[bytearray] = None,
+) -> bytes:
+    return encode_frame_bundle(bundle, PacketID.OSU_SPECTATE_FRAMES, buf)
 
 def set_action(
     action_id: int,
@@ -64,9 +98,10 @@ def set_action(
     mods: int,
     gamemode: int,
     beatmap_id: int,
+    buf: Optional[bytearray] = None,
 ) -> bytes:
     return (
-        PacketWriter()
+        PacketWriter(buf)
             .write_u8(action_id)
             .write_str(action_text)
             .write_str(action_md5)
@@ -76,62 +111,65 @@ def set_action(
             .finish(PacketID.OSU_CHANGE_ACTION)
     )
 
+def join_channel(name: str, buf: Optional[bytearray] = None) -> bytes:
+    return (
+        PacketWriter(buf)
+            .write_str(name)
+            .finish(PacketID.OSU_CHANNEL_JOIN)
+    )
+
 def join_match(
     match_id: int,
     password: str,
+    buf: Optional[bytearray] = None,
 ) -> bytes:
     return (
-        PacketWriter()
+        PacketWriter(buf)
             .write_i32(match_id)
             .write_str(password)
             .finish(PacketID.OSU_JOIN_MATCH)
     )
 
-def match_ready() -> bytes:
-    return (
-        PacketWriter()
-            .finish(PacketID.OSU_MATCH_READY)
-    )
+def match_ready(buf: Optional[bytearray] = None) -> bytes:
+    return _prebuilt(MATCH_READY, buf)
 
-def match_loaded() -> bytes:
-    return (
-        PacketWriter()
-            .finish(PacketID.OSU_MATCH_LOAD_COMPLETE)
-    )
+def match_loaded(buf: Optional[bytearray] = None) -> bytes:
+    return _prebuilt(MATCH_LOADED, buf)
 
-def match_not_ready() -> bytes:
-    return (
-        PacketWriter()
-            .finish(PacketID.OSU_MATCH_UNREADY)
-    )
+def match_not_ready(buf: Optional[bytearray] = None) -> bytes:
+    return _prebuilt(MATCH_NOT_READY, buf)
 
-def match_skip_req() -> bytes:
-    return (
-        PacketWriter()
-            .finish(PacketID.OSU_MATCH_SKIP_REQUEST)
-    )
+def match_skip_req(buf: Optional[bytearray] = None) -> bytes:
+    return _prebuilt(MATCH_SKIP_REQ, buf)
 
-def match_player_finished_map() -> bytes:
-    return (
-        PacketWriter()
-            .finish(PacketID.OSU_MATCH_COMPLETE)
-    )
+def match_player_finished_map(buf: Optional[bytearray] = None) -> bytes:
+    return _prebuilt(MATCH_PLAYER_FINISHED_MAP, buf)
 
-def match_leave() -> bytes:
-    return (
-        PacketWriter()
-            .finish(PacketID.OSU_PART_MATCH)
-    )
+def match_leave(buf: Optional[bytearray] = None) -> bytes:
+    return _prebuilt(MATCH_LEAVE, buf)
+
+def match_invite(user_id: int, buf: Optional[bytearray] = None) -> bytes:
+    return _MATCH_INVITE.build(user_id, buf=buf)
 
-def match_invite(user_id: int) -> bytes:
+def match_start(buf: Optional[bytearray] = None) -> bytes:
+    return _prebuilt(MATCH_START, buf)
+
+def user_stats_request(
+    user_ids: Sequence[int],
+    buf: Optional[bytearray] = None,
+) -> bytes:
     return (
-        PacketWriter()
-            .write_i32(user_id)
-            .finish(PacketID.OSU_MATCH_INVITE)
+        PacketWriter(buf)
+            .write_i32_list(user_ids)
+            .finish(PacketID.OSU_USER_STATS_REQUEST)
     )
 
-def match_start() -> bytes:
+def user_presence_request(
+    user_ids: Sequence[int],
+    buf: Optional[bytearray] = None,
+) -> bytes:
     return (
-        PacketWriter()
-            .finish(PacketID.OSU_MATCH_START)
+        PacketWriter(buf)
+            .write_i32_list(user_ids)
+            .finish(PacketID.OSU_USER_PRESENCE_REQUEST)
     )
@@ -0,0 +1,172 @@
+"""Codecs for spectator replay frame bundles (`SRV_SPECTATE_FRAMES` and
+`OSU_SPECTATE_FRAMES`).
+
+Frames are decoded straight into a NumPy structured array viewing the packet
+buffer when NumPy is installed, falling back to a list of tuples otherwise.
+"""
+
+from __future__ import annotations
+
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Optional,
+    Union,
+)
+import struct
+
+from .constants import PacketID
+from .rw import (
+    PacketReader,
+    PacketWriter,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = (
+    "FRAME_DTYPE",
+    "ScoreFrame",
+    "ReplayFrameBundle",
+    "read_frames",
+    "write_frames",
+    "read_score_frame",
+    "write_score_frame",
+    "read_frame_bundle",
+    "write_frame_bundle",
+    "encode_frame_bundle",
+)
+
+# (button state, taiko byte, x, y, time)
+_FRAME = struct.Struct("<BBffi")
+_SCORE_FRAME = struct.Struct("<iBHHHHHHiHHBBBB")
+_SCORE_V2 = struct.Struct("<dd")
+
+FRAME_DTYPE = numpy.dtype([
+    ("button_state", "u1"),
+    ("taiko_byte", "u1"),
+    ("x", "<f4"),
+    ("y", "<f4"),
+    ("time", "<i4"),
+]) if numpy is not None else None
+
+ScoreFrame = namedtuple("ScoreFrame", (
+    "time",
+    "id",
+    "n300",
+    "n100",
+    "n50",
+    "ngeki",
+    "nkatu",
+    "nmiss",
+    "total_score",
+    "max_combo",
+    "current_combo",
+    "perfect",
+    "current_hp",
+    "tag_byte",
+    "score_v2",
+    "combo_portion",
+    "bonus_portion",
+), defaults=(0.0, 0.0))
+# The number of score frame fields excluding the score v2 portions.
+_SCORE_FRAME_FIELDS = len(ScoreFrame._fields) - 2
+
+# A NumPy array of `FRAME_DTYPE` or a list of frame tuples.
+Frames = Union["numpy.ndarray", list[tuple[int, int, float, float, int]]]
+
+@dataclass
+class ReplayFrameBundle:
+    """A bundle of replay frames sent to and from spectators."""
+
+    extra: int
+    frames: Frames
+    action: int
+    score_frame: ScoreFrame
+    sequence: int
+
+def read_frames(reader: PacketReader, use_numpy: bool = True) -> Frames:
+    """Reads a u16 prefixed array of replay frames.
+
+    Args:
+        reader: The reader positioned at the frame count.
+        use_numpy: Whether to return a NumPy structured array viewing the
+            buffer. Ignored if NumPy is not installed.
+    """
+
+    count = reader.read_u16()
+    start = reader._pos
+    end = start + count * _FRAME.size
+    reader._pos = end
+
+    if use_numpy and numpy is not None:
+        return numpy.frombuffer(
+            reader._buf, dtype=FRAME_DTYPE, count=count, offset=start,
+        )
+    return list(_FRAME.iter_unpack(reader._buf[start:end]))
+
+def write_frames(writer: PacketWriter, frames: Frames) -> None:
+    """Writes a u16 prefixed array of replay frames."""
+
+    writer.write_u16(len(frames))
+    if numpy is not None and isinstance(frames, numpy.ndarray):
+        writer.write_raw(frames.astype(FRAME_DTYPE, copy=False).tobytes())
+        return
+
+    pack = _FRAME.pack
+    writer.write_raw(b"".join(pack(*frame) for frame in frames))
+
+def read_score_frame(reader: PacketReader) -> ScoreFrame:
+    """Reads a score frame, including the score v2 portions if present."""
+
+    fields: tuple[Any, ...] = _SCORE_FRAME.unpack_from(reader._buf, reader._pos)
+    reader._pos += _SCORE_FRAME.size
+    if fields[-1]:
+        fields += _SCORE_V2.unpack_from(reader._buf, reader._pos)
+        reader._pos += _SCORE_V2.size
+    return ScoreFrame(*fields)
+
+def write_score_frame(writer: PacketWriter, frame: ScoreFrame) -> None:
+    """Writes a score frame, including the score v2 portions if enabled."""
+
+    writer.write_raw(_SCORE_FRAME.pack(*frame[:_SCORE_FRAME_FIELDS]))
+    if frame.score_v2:
+        writer.write_raw(_SCORE_V2.pack(frame.combo_portion, frame.bonus_portion))
+
+def read_frame_bundle(
+    reader: PacketReader,
+    use_numpy: bool = True,
+) -> ReplayFrameBundle:
+    """Reads a replay frame bundle from the body of a spectate frames packet."""
+
+    return ReplayFrameBundle(
+        extra=reader.read_i32(),
+        frames=read_frames(reader, use_numpy),
+        action=reader.read_u8(),
+        score_frame=read_score_frame(reader),
+        sequence=reader.read_u16(),
+    )
+
+def write_frame_bundle(writer: PacketWriter, bundle: ReplayFrameBundle) -> None:
+    """Writes a replay frame bundle."""
+
+    writer.write_i32(bundle.extra)
+    write_frames(writer, bundle.frames)
+    writer.write_u8(bundle.action)
+    write_score_frame(writer, bundle.score_frame)
+    writer.write_u16(bundle.sequence)
+
+def encode_frame_bundle(
+    bundle: ReplayFrameBundle,
+    packet_id: PacketID = PacketID.OSU_SPECTATE_FRAMES,
+    buf: Optional[bytearray] = None,
+) -> bytearray:
+    """Encodes a full spectate frames packet from a bundle, optionally
+    appending it to `buf` in place."""
+
+    writer = PacketWriter(buf)
+    write_frame_bundle(writer, bundle)
+    return writer.finish(packet_id)
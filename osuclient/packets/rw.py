@@ -2,28 +2,157 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from . import constants
+import array
+import functools
 import struct
+import sys
+
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Optional,
+    Sequence,
+    Union,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ByteLike = Union[bytes, bytearray, memoryview]
+
+_HEADER = struct.Struct("<HxI")
+_EMPTY_HEADER = bytes(constants.HEADER_LEN)
+_PACKET_IDS = {packet_id.value: packet_id for packet_id in constants.PacketID}
+
+_I8 = struct.Struct("<b")
+_I16 = struct.Struct("<h")
+_U16 = struct.Struct("<H")
+_I32 = struct.Struct("<i")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_U64 = struct.Struct("<Q")
+_F32 = struct.Struct("<f")
+
+# The array typecode of a 32-bit integer on this platform.
+_I32_TYPECODE = "i" if array.array("i").itemsize == 4 else "l"
+_BIG_ENDIAN = sys.byteorder == "big"
+
+def encode_uleb128(value: int) -> bytes:
+    """Encodes an integer as uleb128."""
+
+    data = bytearray()
+    while value >= 0x80:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+def encode_str(value: str) -> bytes:
+    """Encodes an osu! string (exists byte, uleb128 byte length and the UTF-8
+    contents)."""
+
+    if not value:
+        return b"\x00"
+    encoded = value.encode()
+    return b"\x0b" + encode_uleb128(len(encoded)) + encoded
+
+# The default number of strings kept by the string encode cache.
+STR_CACHE_SIZE = 4096
+# The longest string (in characters) considered for caching.
+STR_CACHE_MAX_LENGTH = 256
+
+class StringEncodeCache:
+    """A bounded LRU cache of pre-encoded osu! strings, for the channel
+    names, targets and message templates which are written repeatedly.
+
+    Args:
+        max_size: The maximum number of cached strings.
+        max_length: The longest string (in characters) to cache. Longer
+            strings are encoded without touching the cache.
+    """
 
-from typing import Union
+    __slots__ = (
+        "_encode",
+        "max_length",
+    )
+
+    def __init__(
+        self,
+        max_size: int = STR_CACHE_SIZE,
+        max_length: int = STR_CACHE_MAX_LENGTH,
+    ) -> None:
+        self._encode = functools.lru_cache(maxsize=max_size)(encode_str)
+        self.max_length = max_length
+
+    def __len__(self) -> int:
+        return self._encode.cache_info().currsize
+
+    @property
+    def hits(self) -> int:
+        """Returns the number of lookups served from the cache."""
+        return self._encode.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        """Returns the number of lookups which had to encode the string."""
+        return self._encode.cache_info().misses
+
+    @property
+    def max_size(self) -> int:
+        """Returns the maximum number of cached strings."""
+        return self._encode.cache_info().maxsize
+
+    def encode(self, value: str) -> bytes:
+        """Returns the encoded form of an osu! string, using the cache where
+        possible."""
+
+        if len(value) > self.max_length:
+            return encode_str(value)
+        return self._encode(value)
 
-ByteLike = Union[bytes, bytearray]
+    def resize(self, max_size: int) -> None:
+        """Changes the maximum size of the cache, clearing it."""
+        self._encode = functools.lru_cache(maxsize=max_size)(encode_str)
+
+    def clear(self) -> None:
+        """Clears the cache and resets its counters."""
+        self._encode.cache_clear()
+
+# The cache used by `PacketWriter.write_str`.
+STR_ENCODE_CACHE = StringEncodeCache()
 
 class PacketWriter:
     """A binary writer class specifically tailored for writing osu!bancho
-    packets. Supports builder pattern."""
+    packets. Supports builder pattern.
+
+    Args:
+        buf: An existing buffer (such as a client's queue) to append the
+            packet to in place. A new buffer is allocated if not provided.
+    """
 
     __slots__ = (
         "_buf",
+        "_start",
     )
 
-    def __init__(self) -> None:
-        self._buf = bytearray(b"\x00" * constants.HEADER_LEN) # Preallocate header
+    def __init__(self, buf: Optional[bytearray] = None) -> None:
+        if buf is None:
+            buf = bytearray(constants.HEADER_LEN) # Preallocate header
+            self._start = 0
+        else:
+            self._start = len(buf)
+            buf += _EMPTY_HEADER
+        self._buf = buf
 
     def write_i8(self, value: int) -> "PacketWriter":
         """Writes an 8-bit integer."""
-        self._buf.append(value)
+        self._buf += _I8.pack(value)
         return self
-    
+
     def write_u8(self, value: int) -> "PacketWriter":
         """Writes an 8-bit unsigned integer."""
         self._buf.append(value)
@@ -31,37 +160,64 @@ class PacketWriter:
 
     def write_i16(self, value: int) -> "PacketWriter":
         """Writes a 16-bit integer."""
-        self._buf.extend(struct.pack("<h", value))
+        self._buf += _I16.pack(value)
         return self
 
     def write_u16(self, value: int) -> "PacketWriter":
         """Writes a 16-bit unsigned integer."""
-        self._buf.extend(struct.pack("<H", value))
+        self._buf += _U16.pack(value)
         return self
-    
+
     def write_i32(self, value: int) -> "PacketWriter":
         """Writes a 32-bit integer."""
-        self._buf.extend(struct.pack("<i", value))
+        self._buf += _I32.pack(value)
         return self
 
     def write_u32(self, value: int) -> "PacketWriter":
         """Writes a 32-bit unsigned integer."""
-        self._buf.extend(struct.pack("<I", value))
+        self._buf += _U32.pack(value)
         return self
 
     def write_i64(self, value: int) -> "PacketWriter":
         """Writes a 64-bit integer."""
-        self._buf.extend(struct.pack("<q", value))
+        self._buf += _I64.pack(value)
         return self
 
     def write_u64(self, value: int) -> "PacketWriter":
         """Writes a 64-bit unsigned integer."""
-        self._buf.extend(struct.pack("<Q", value))
+        self._buf += _U64.pack(value)
         return self
 
     def write_f32(self, value: float) -> "PacketWriter":
         """Writes a 32-bit floating point number."""
-        self._buf.extend(struct.pack("<f", value))
+        self._buf += _F32.pack(value)
+        return self
+
+    def write_i32_list(self, values: Sequence[int]) -> "PacketWriter":
+        """Writes an i16 prefixed list of 32-bit integers.
+
+        Note:
+            `array.array` and NumPy arrays are written in bulk. The count is
+            written unsigned (as `read_i32_list` reads it), allowing up to
+            65535 elements.
+        """
+
+        self.write_u16(len(values))
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            self._buf += values.astype("<i4", copy=False).tobytes()
+            return self
+
+        if not isinstance(values, array.array) \
+            or values.typecode != _I32_TYPECODE or _BIG_ENDIAN:
+            values = array.array(_I32_TYPECODE, values)
+            if _BIG_ENDIAN:
+                values.byteswap()
+        self._buf += values
+        return self
+
+    def write_raw(self, data: ByteLike) -> "PacketWriter":
+        """Writes raw bytes."""
+        self._buf += data
         return self
 
     def write_uleb128(self, value: int) -> "PacketWriter":
@@ -73,27 +229,142 @@ class PacketWriter:
         return self
     
     def write_str(self, value: str) -> "PacketWriter":
-        """Writes a string."""
-
-        # Exists byte.
-        if not value:
-            self.write_i8(0)
-            return self
-
-        self.write_i8(0xb)
-        self.write_uleb128(len(value))
-        self._buf.extend(value.encode())
+        """Writes a string, prefixed by its UTF-8 byte length."""
+
+        # Inlined `StringEncodeCache.encode`, saving a call per string.
+        cache = STR_ENCODE_CACHE
+        if len(value) > cache.max_length:
+            self._buf += encode_str(value)
+        else:
+            self._buf += cache._encode(value)
         return self
     
     def finish(self, packet_id: constants.PacketID) -> bytearray:
-        """Completes packet creation by writing the header."""
-        self._buf[0:7] = struct.pack(
-            "<HxI",
-            packet_id.value,
-            len(self._buf) - constants.HEADER_LEN,
+        """Completes packet creation by back-patching the header, returning
+        the buffer the packet was written to."""
+        _HEADER.pack_into(
+            self._buf, self._start,
+            packet_id,
+            len(self._buf) - self._start - constants.HEADER_LEN,
         )
         return self._buf
 
+class PacketTemplate:
+    """A pre-serialised fixed layout packet. Building one copies the
+    prebuilt bytes and patches the field values in at their fixed offsets.
+
+    Args:
+        packet_id: The ID of the packet.
+        fmt: The `struct` format of the packet body (without byte order).
+    """
+
+    __slots__ = (
+        "_packer",
+        "_template",
+        "_header",
+    )
+
+    def __init__(self, packet_id: constants.PacketID, fmt: str) -> None:
+        self._packer = struct.Struct("<" + fmt)
+        self._template = bytes(
+            PacketWriter()
+                .write_raw(bytes(self._packer.size))
+                .finish(packet_id)
+        )
+        self._header = self._template[:constants.HEADER_LEN]
+
+    def build(self, *values: Any, buf: Optional[bytearray] = None) -> bytearray:
+        """Builds the packet with the given field values, optionally
+        appending it to `buf` in place."""
+
+        if buf is None:
+            buf = bytearray(self._template)
+            self._packer.pack_into(buf, constants.HEADER_LEN, *values)
+            return buf
+
+        # Packed before appending so a failure leaves `buf` untouched.
+        body = self._packer.pack(*values)
+        buf += self._header
+        buf += body
+        return buf
+
+# The default number of strings kept by a string decode cache.
+STR_DECODE_CACHE_SIZE = 16384
+
+class StringDecodeCache:
+    """A bounded cache mapping raw string bytes to decoded strings, so the
+    usernames and channel names repeated throughout server traffic skip
+    UTF-8 decoding and share a single `str` object.
+
+    Note:
+        Once full, the oldest entries are evicted first.
+
+    Args:
+        max_size: The maximum number of cached strings.
+        max_length: The longest string (in bytes) to cache.
+    """
+
+    __slots__ = (
+        "_cache",
+        "max_size",
+        "max_length",
+        "hits",
+        "misses",
+    )
+
+    def __init__(
+        self,
+        max_size: int = STR_DECODE_CACHE_SIZE,
+        max_length: int = STR_CACHE_MAX_LENGTH,
+    ) -> None:
+        self._cache: dict[bytes, str] = {}
+        self.max_size = max_size
+        self.max_length = max_length
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def decode(self, raw: ByteLike) -> str:
+        """Decodes raw UTF-8 string bytes, using the cache where possible."""
+
+        if len(raw) > self.max_length:
+            return str(raw, "utf-8")
+
+        try:
+            # Read-only views hash like bytes, so no copy is needed to look
+            # them up.
+            value = self._cache.get(raw)
+        except (TypeError, ValueError):
+            raw = bytes(raw)
+            value = self._cache.get(raw)
+
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        key = bytes(raw)
+        # ASCII is by far the most common case and decodes with a plain copy.
+        value = str(key, "ascii") if key.isascii() else str(key, "utf-8")
+        self._cache[key] = value
+        if len(self._cache) > self.max_size:
+            del self._cache[next(iter(self._cache))]
+        return value
+
+    def clear(self) -> None:
+        """Clears the cache and resets its counters."""
+
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+# The cache used by `PacketReader.read_str`. Disabled (`None`) by default, as
+# it only pays off when the same strings are seen repeatedly. Assign a
+# `StringDecodeCache` to enable it for every reader.
+STR_DECODE_CACHE: Optional[StringDecodeCache] = None
+
 class PacketReader:
     """A binary reader class made specifically for the reading of osu! packets."""
 
@@ -107,13 +378,27 @@ class PacketReader:
         """Returns whether the reader is empty."""
         return self._pos >= len(self._buf)
 
+    @property
+    def position(self) -> int:
+        """Returns the offset of the next byte to be read."""
+        return self._pos
+
+    @position.setter
+    def position(self, value: int) -> None:
+        self._pos = value
+
     def __init__(self, buf: ByteLike) -> None:
         self._buf = buf
         self._pos = 0
 
+    def __reduce__(self) -> tuple:
+        # Pickles a copy of the unread bytes, as memoryviews can't be
+        # pickled (eg. when sending a packet to a process pool).
+        return (PacketReader, (bytes(self._buf[self._pos:]),))
+
     def read_i8(self) -> int:
         """Reads an 8-bit integer."""
-        value = self._buf[self._pos]
+        value = _I8.unpack_from(self._buf, self._pos)[0]
         self._pos += 1
         return value
 
@@ -125,46 +410,73 @@ class PacketReader:
 
     def read_i16(self) -> int:
         """Reads a 16-bit integer."""
-        value = struct.unpack("<h", self._buf[self._pos:self._pos + 2])[0]
+        value = _I16.unpack_from(self._buf, self._pos)[0]
         self._pos += 2
         return value
 
     def read_u16(self) -> int:
         """Reads a 16-bit unsigned integer."""
-        value = struct.unpack("<H", self._buf[self._pos:self._pos + 2])[0]
+        value = _U16.unpack_from(self._buf, self._pos)[0]
         self._pos += 2
         return value
 
     def read_i32(self) -> int:
         """Reads a 32-bit integer."""
-        value = struct.unpack("<i", self._buf[self._pos:self._pos + 4])[0]
+        value = _I32.unpack_from(self._buf, self._pos)[0]
         self._pos += 4
         return value
 
     def read_u32(self) -> int:
         """Reads a 32-bit unsigned integer."""
-        value = struct.unpack("<I", self._buf[self._pos:self._pos + 4])[0]
+        value = _U32.unpack_from(self._buf, self._pos)[0]
         self._pos += 4
         return value
 
     def read_i64(self) -> int:
         """Reads a 64-bit integer."""
-        value = struct.unpack("<q", self._buf[self._pos:self._pos + 8])[0]
+        value = _I64.unpack_from(self._buf, self._pos)[0]
         self._pos += 8
         return value
 
     def read_u64(self) -> int:
         """Reads a 64-bit unsigned integer."""
-        value = struct.unpack("<Q", self._buf[self._pos:self._pos + 8])[0]
+        value = _U64.unpack_from(self._buf, self._pos)[0]
         self._pos += 8
         return value
     
     def read_f32(self) -> float:
         """Reads a 32-bit floating point number."""
-        value = struct.unpack("<f", self._buf[self._pos:self._pos + 4])[0]
+        value = _F32.unpack_from(self._buf, self._pos)[0]
         self._pos += 4
         return value
 
+    def read_i32_list(self, as_numpy: bool = False) -> Sequence[int]:
+        """Reads an i16 prefixed list of 32-bit integers into an
+        `array.array`.
+
+        Args:
+            as_numpy: Whether to return a NumPy view of the buffer instead.
+                Falls back to an `array.array` if NumPy is not installed.
+        """
+
+        # The count is an i16 on the wire, but read unsigned to tolerate
+        # servers writing up to 65535 elements.
+        count = self.read_u16()
+        end = self._pos + count * 4
+
+        if as_numpy and numpy is not None:
+            values = numpy.frombuffer(
+                self._buf, dtype="<i4", count=count, offset=self._pos,
+            )
+        else:
+            values = array.array(_I32_TYPECODE)
+            values.frombytes(self._buf[self._pos:end])
+            if _BIG_ENDIAN:
+                values.byteswap()
+
+        self._pos = end
+        return values
+
     def read_uleb128(self) -> int:
         """Reads a uleb128 integer."""
         value = 0
@@ -179,26 +491,29 @@ class PacketReader:
 
     def read_str(self) -> str:
         """Reads a string."""
-        if self.read_i8() != 0xb:
+        if self.read_u8() != 0xb:
             return ""
         length = self.read_uleb128()
-        string = self._buf[self._pos:self._pos + length].decode()
+        raw = self._buf[self._pos:self._pos + length]
         self._pos += length
-        return string
+        if STR_DECODE_CACHE is not None:
+            return STR_DECODE_CACHE.decode(raw)
+        return str(raw, "utf-8")
     
     def skip(self, length: int) -> None:
         """Skips a certain amount of bytes."""
         self._pos += length
     
-    def read_header(self) -> tuple[constants.PacketID, int]:
-        """Reads the osu packet header.
+    def read_header(self) -> tuple[int, int]:
+        """Reads the osu packet header, returning the raw packet ID and the
+        packet length.
         
         Note:
             You are responsible for incrementing the buffer if you do not
             read the rest of the packet.
         """
 
-        packet_id = constants.PacketID(self.read_u16())
+        packet_id = self.read_u16()
         # Pad byte.
         self.skip(1)
         packet_length = self.read_u32()
@@ -214,26 +529,191 @@ class PacketReader:
     def __iter__(self) -> "PacketReader":
         return self
     
-    def __next__(self) -> tuple[constants.PacketID, int]:
+    def __next__(self) -> tuple[int, int]:
         if self.empty:
             raise StopIteration
         return self.read_header()
 
+def frame_packets(buf: ByteLike) -> list[tuple[int, int, int]]:
+    """Splits a buffer of packets into `(id, offset, length)` frames without
+    copying any of the packet bodies.
+
+    Note:
+        The offset points to the start of the packet body (after the header).
+        A truncated trailing packet is reported with the length that is
+        actually available in the buffer.
+    """
+
+    frames: list[tuple[int, int, int]] = []
+    unpack_header = _HEADER.unpack_from
+    buf_len = len(buf)
+    pos = 0
+
+    while pos + constants.HEADER_LEN <= buf_len:
+        packet_id, length = unpack_header(buf, pos)
+        pos += constants.HEADER_LEN
+        length = min(length, buf_len - pos)
+        frames.append((packet_id, pos, length))
+        pos += length
+
+    return frames
+
 @dataclass
 class PacketContext:
-    id: constants.PacketID
+    raw_id: int
     length: int
     reader: PacketReader
 
+    @property
+    def id(self) -> Union[constants.PacketID, int]:
+        """Returns the packet ID as a `PacketID` member, or the raw ID if it
+        is not known."""
+        return _PACKET_IDS.get(self.raw_id, self.raw_id)
+
+    def copy(self) -> PacketContext:
+        """Returns a copy of the context with its own reader (sharing the
+        same buffer), so it may be read later without affecting others."""
+
+        reader = PacketReader(self.reader._buf)
+        reader._pos = self.reader._pos
+        return PacketContext(self.raw_id, self.length, reader)
+
     @staticmethod
     def create_from_buffers(buf: ByteLike) -> list[PacketContext]:
-        """Creates a list of packet contexts from a buffer."""
-        reader = PacketReader(buf)
+        """Creates a list of packet contexts from a buffer.
+
+        Every context's reader is bound to a view of only its own packet body,
+        sharing the memory of `buf`.
+        """
+
+        view = memoryview(buf)
+        return [
+            PacketContext(
+                packet_id,
+                length,
+                PacketReader(view[offset:offset + length]),
+            )
+            for packet_id, offset, length in frame_packets(view)
+        ]
+
+class PacketFramer:
+    """A stateful framer splitting a stream of arbitrarily sized chunks into
+    packets, keeping partial headers and bodies between chunks.
+
+    Args:
+        wants: An optional predicate taking a raw packet ID. Bodies of packets
+            it rejects are skipped by offset without being buffered or
+            wrapped in a context.
+    """
+
+    __slots__ = (
+        "_wants",
+        "_header",
+        "_body",
+        "_packet_id",
+        "_length",
+        "_skip",
+    )
+
+    def __init__(self, wants: Optional[Callable[[int], bool]] = None) -> None:
+        self._wants = wants
+        self._header = bytearray()
+        self._body = bytearray()
+        self._packet_id = -1 # -1 while waiting for a header.
+        self._length = 0
+        self._skip = 0 # Bytes left of an unwanted packet body.
+
+    @property
+    def pending(self) -> bool:
+        """Returns whether a partially received packet is buffered."""
+        return bool(self._header) or self._packet_id >= 0 or self._skip > 0
+
+    def feed(self, chunk: ByteLike) -> list[PacketContext]:
+        """Feeds a chunk into the framer, returning contexts for every packet
+        completed by it.
+
+        Note:
+            Packets contained entirely within `chunk` are returned as views of
+            it. Only wanted packets spanning several chunks are buffered.
+        """
+
+        view = memoryview(chunk)
+        view_len = len(view)
+        wants = self._wants
         ctxs: list[PacketContext] = []
+        pos = 0
 
-        while not reader.empty:
-            packet_id, length = reader.read_header()
-            ctxs.append(PacketContext(packet_id, length, reader))
-            reader = PacketReader(reader.remove_excess(length))
-        
-        return ctxs
\ No newline at end of file
+        while True:
+            # Continue skipping a body started in a previous chunk.
+            if self._skip:
+                skipped = min(self._skip, view_len - pos)
+                pos += skipped
+                self._skip -= skipped
+                if self._skip:
+                    break
+
+            # Continue a body started in a previous chunk.
+            if self._packet_id >= 0:
+                needed = self._length - len(self._body)
+                self._body += view[pos:pos + needed]
+                pos += needed
+                if len(self._body) < self._length:
+                    break
+
+                ctxs.append(PacketContext(
+                    self._packet_id,
+                    self._length,
+                    PacketReader(bytes(self._body)),
+                ))
+                self._body.clear()
+                self._packet_id = -1
+                continue
+
+            if pos >= view_len:
+                break
+
+            # Read the header, possibly completing one split across chunks.
+            if self._header or view_len - pos < constants.HEADER_LEN:
+                needed = constants.HEADER_LEN - len(self._header)
+                self._header += view[pos:pos + needed]
+                pos += needed
+                if len(self._header) < constants.HEADER_LEN:
+                    break
+                packet_id, length = _HEADER.unpack(self._header)
+                self._header.clear()
+            else:
+                packet_id, length = _HEADER.unpack_from(view, pos)
+                pos += constants.HEADER_LEN
+
+            if wants is not None and not wants(packet_id):
+                self._skip = length
+            elif view_len - pos >= length:
+                ctxs.append(PacketContext(
+                    packet_id,
+                    length,
+                    PacketReader(view[pos:pos + length]),
+                ))
+                pos += length
+            else:
+                self._packet_id = packet_id
+                self._length = length
+
+        return ctxs
+
+async def stream_packets(
+    chunks: AsyncIterable[ByteLike],
+    wants: Optional[Callable[[int], bool]] = None,
+) -> AsyncIterator[PacketContext]:
+    """Yields packet contexts from an asynchronous stream of chunks as soon
+    as each packet has fully arrived.
+
+    Args:
+        chunks: The stream of response chunks.
+        wants: An optional predicate taking a raw packet ID, selecting which
+            packets are materialised. All others are skipped.
+    """
+
+    framer = PacketFramer(wants)
+    async for chunk in chunks:
+        for ctx in framer.feed(chunk):
+            yield ctx
@@ -0,0 +1,434 @@
+"""A declarative description of the field layouts of every osu! packet.
+
+Each layout is compiled on first use into a specialised decoder and encoder.
+Runs of adjacent fixed-width fields are merged into a single precompiled
+`struct.Struct` call, so decoding does not pay for a method call per field.
+"""
+
+from __future__ import annotations
+
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Optional,
+)
+import struct
+
+from . import replay
+from .constants import PacketID
+from .rw import (
+    PacketReader,
+    PacketWriter,
+)
+
+__all__ = (
+    "SCHEMAS",
+    "Match",
+    "PacketCodec",
+    "get_codec",
+    "decode",
+    "encode",
+)
+
+Field = tuple[str, str]
+
+# Fixed width field types mapped to their struct format characters.
+FIXED_TYPES = {
+    "i8": "b",
+    "u8": "B",
+    "i16": "h",
+    "u16": "H",
+    "i32": "i",
+    "u32": "I",
+    "i64": "q",
+    "u64": "Q",
+    "f32": "f",
+    "f64": "d",
+}
+
+# Commonly shared layouts.
+MESSAGE: tuple[Field, ...] = (
+    ("sender", "str"),
+    ("content", "str"),
+    ("target", "str"),
+    ("sender_id", "i32"),
+)
+
+CHANNEL: tuple[Field, ...] = (
+    ("name", "str"),
+    ("topic", "str"),
+    ("player_count", "i16"),
+)
+
+ACTION: tuple[Field, ...] = (
+    ("action", "u8"),
+    ("info_text", "str"),
+    ("map_md5", "str"),
+    ("mods", "u32"),
+    ("mode", "u8"),
+    ("map_id", "i32"),
+)
+
+REPLAY_FRAME_BUNDLE: tuple[Field, ...] = (("bundle", "frame_bundle"),)
+SCORE_FRAME: tuple[Field, ...] = (("score_frame", "score_frame"),)
+
+USER_ID: tuple[Field, ...] = (("user_id", "i32"),)
+SLOT_ID: tuple[Field, ...] = (("slot_id", "i32"),)
+MATCH: tuple[Field, ...] = (("match", "match"),)
+
+SCHEMAS: dict[PacketID, tuple[Field, ...]] = {
+    PacketID.OSU_CHANGE_ACTION: ACTION,
+    PacketID.OSU_SEND_PUBLIC_MESSAGE: MESSAGE,
+    PacketID.OSU_LOGOUT: (),
+    PacketID.OSU_REQUEST_STATUS_UPDATE: (),
+    PacketID.OSU_HEARTBEAT: (),
+    PacketID.SRV_LOGIN_REPLY: USER_ID,
+    PacketID.SRV_SEND_MESSAGE: MESSAGE,
+    PacketID.SRV_HEARTBEAT: (),
+    PacketID.SRV_USER_STATS: (
+        ("user_id", "i32"),
+        *ACTION,
+        ("ranked_score", "i64"),
+        ("accuracy", "f32"),
+        ("plays", "i32"),
+        ("total_score", "i64"),
+        ("rank", "i32"),
+        ("pp", "u16"),
+    ),
+    PacketID.SRV_USER_LOGOUT: (
+        ("user_id", "i32"),
+        ("unused", "u8"),
+    ),
+    PacketID.SRV_SPECTATOR_JOINED: USER_ID,
+    PacketID.SRV_SPECTATOR_LEFT: USER_ID,
+    PacketID.SRV_SPECTATE_FRAMES: REPLAY_FRAME_BUNDLE,
+    PacketID.OSU_START_SPECTATING: USER_ID,
+    PacketID.OSU_STOP_SPECTATING: (),
+    PacketID.OSU_SPECTATE_FRAMES: REPLAY_FRAME_BUNDLE,
+    PacketID.SRV_VERSION_UPDATE: (),
+    PacketID.OSU_ERROR_REPORT: (("error", "str"),),
+    PacketID.OSU_CANT_SPECTATE: (),
+    PacketID.SRV_SPECTATOR_CANT_SPECTATE: USER_ID,
+    PacketID.SRV_GET_ATTENTION: (),
+    PacketID.SRV_NOTIFICATION: (("message", "str"),),
+    PacketID.OSU_SEND_PRIVATE_MESSAGE: MESSAGE,
+    PacketID.SRV_UPDATE_MATCH: MATCH,
+    PacketID.SRV_NEW_MATCH: MATCH,
+    PacketID.SRV_DISPOSE_MATCH: (("match_id", "i32"),),
+    PacketID.OSU_PART_LOBBY: (),
+    PacketID.OSU_JOIN_LOBBY: (),
+    PacketID.OSU_CREATE_MATCH: MATCH,
+    PacketID.OSU_JOIN_MATCH: (
+        ("match_id", "i32"),
+        ("password", "str"),
+    ),
+    PacketID.OSU_PART_MATCH: (),
+    PacketID.SRV_TOGGLE_BLOCK_NON_FRIEND_DMS: (("value", "i32"),),
+    PacketID.SRV_MATCH_JOIN_SUCCESS: MATCH,
+    PacketID.SRV_MATCH_JOIN_FAIL: (),
+    PacketID.OSU_MATCH_CHANGE_SLOT: SLOT_ID,
+    PacketID.OSU_MATCH_READY: (),
+    PacketID.OSU_MATCH_LOCK: SLOT_ID,
+    PacketID.OSU_MATCH_CHANGE_SETTINGS: MATCH,
+    PacketID.SRV_FELLOW_SPECTATOR_JOINED: USER_ID,
+    PacketID.SRV_FELLOW_SPECTATOR_LEFT: USER_ID,
+    PacketID.OSU_MATCH_START: (),
+    PacketID.SRV_ALL_PLAYERS_LOADED: (),
+    PacketID.SRV_MATCH_START: MATCH,
+    PacketID.OSU_MATCH_SCORE_UPDATE: SCORE_FRAME,
+    PacketID.SRV_MATCH_SCORE_UPDATE: SCORE_FRAME,
+    PacketID.OSU_MATCH_COMPLETE: (),
+    PacketID.SRV_MATCH_TRANSFER_HOST: (),
+    PacketID.OSU_MATCH_CHANGE_MODS: (("mods", "i32"),),
+    PacketID.OSU_MATCH_LOAD_COMPLETE: (),
+    PacketID.SRV_MATCH_ALL_PLAYERS_LOADED: (),
+    PacketID.OSU_MATCH_NO_BEATMAP: (),
+    PacketID.OSU_MATCH_UNREADY: (),
+    PacketID.OSU_MATCH_FAILED: (),
+    PacketID.SRV_MATCH_PLAYER_FAILED: SLOT_ID,
+    PacketID.SRV_MATCH_COMPLETE: (),
+    PacketID.OSU_MATCH_HAS_BEATMAP: (),
+    PacketID.OSU_MATCH_SKIP_REQUEST: (),
+    PacketID.SRV_MATCH_SKIP: (),
+    PacketID.OSU_CHANNEL_JOIN: (("channel", "str"),),
+    PacketID.SRV_CHANNEL_JOIN_SUCCESS: (("channel", "str"),),
+    PacketID.SRV_CHANNEL_INFO: CHANNEL,
+    PacketID.SRV_CHANNEL_KICK: (("channel", "str"),),
+    PacketID.SRV_CHANNEL_AUTO_JOIN: CHANNEL,
+    PacketID.OSU_BEATMAP_INFO_REQUEST: (("data", "raw"),),
+    PacketID.SRV_BEATMAP_INFO_REPLY: (("data", "raw"),),
+    PacketID.OSU_MATCH_TRANSFER_HOST: SLOT_ID,
+    PacketID.SRV_PRIVILEGES: (("privileges", "i32"),),
+    PacketID.SRV_FRIENDS_LIST: (("user_ids", "i32_list"),),
+    PacketID.OSU_FRIEND_ADD: USER_ID,
+    PacketID.OSU_FRIEND_REMOVE: USER_ID,
+    PacketID.SRV_PROTOCOL_VERSION: (("version", "i32"),),
+    PacketID.SRV_MAIN_MENU_ICON: (("icon", "str"),),
+    PacketID.OSU_MATCH_CHANGE_TEAM: (),
+    PacketID.OSU_CHANNEL_PART: (("channel", "str"),),
+    PacketID.OSU_RECEIVE_UPDATES: (("filter", "i32"),),
+    PacketID.SRV_MATCH_PLAYER_SKIPPED: SLOT_ID,
+    PacketID.OSU_SET_AWAY_MESSAGE: MESSAGE,
+    PacketID.SRV_USER_PRESENCE: (
+        ("user_id", "i32"),
+        ("name", "str"),
+        ("utc_offset", "u8"),
+        ("country", "u8"),
+        ("bancho_priv", "u8"),
+        ("lat", "f32"),
+        ("lon", "f32"),
+        ("rank", "i32"),
+    ),
+    PacketID.OSU_USER_STATS_REQUEST: (("user_ids", "i32_list"),),
+    PacketID.SRV_RESTART: (("delay_ms", "i32"),),
+    PacketID.OSU_MATCH_INVITE: USER_ID,
+    PacketID.SRV_MATCH_INVITE: MESSAGE,
+    PacketID.SRV_CHANNEL_INFO_END: (),
+    PacketID.OSU_MATCH_CHANGE_PASSWORD: MATCH,
+    PacketID.SRV_MATCH_CHANGE_PASSWORD: (("password", "str"),),
+    PacketID.SRV_SILENCE_END: (("delta", "i32"),),
+    PacketID.OSU_TOURNAMENT_MATCH_INFO_REQUEST: (("match_id", "i32"),),
+    PacketID.SRV_USER_SILENCED: USER_ID,
+    PacketID.SRV_USER_PRESENCE_SINGLE: USER_ID,
+    PacketID.SRV_USER_PRESENCE_BUNDLE: (("user_ids", "i32_list"),),
+    PacketID.OSU_USER_PRESENCE_REQUEST: (("user_ids", "i32_list"),),
+    PacketID.OSU_USER_PRESENCE_REQUEST_ALL: (),
+    PacketID.OSU_TOGGLE_BLOCK_NON_FRIEND_DMS: (("value", "i32"),),
+    PacketID.SRV_USER_DM_BLOCKED: MESSAGE,
+    PacketID.SRV_TARGET_IS_SILENCED: MESSAGE,
+    PacketID.SRV_VERSION_UPDATE_FORCED: (),
+    PacketID.SRV_SWITCH_SERVER: (("delay", "i32"),),
+    PacketID.SRV_ACCOUNT_RESTRICTED: (),
+    PacketID.SRV_MATCH_ABORT: (),
+    PacketID.SRV_SWITCH_TOURNAMENT_SERVER: (("ip", "str"),),
+    PacketID.OSU_TOURNAMENT_JOIN_MATCH_CHANNEL: (("match_id", "i32"),),
+    PacketID.OSU_TOURNAMENT_LEAVE_MATCH_CHANNEL: (("match_id", "i32"),),
+}
+
+# Variable width types.
+Match = namedtuple("Match", (
+    "id",
+    "in_progress",
+    "powerplay",
+    "mods",
+    "name",
+    "password",
+    "map_name",
+    "map_id",
+    "map_md5",
+    "slot_statuses",
+    "slot_teams",
+    "slot_ids",
+    "host_id",
+    "mode",
+    "win_condition",
+    "team_type",
+    "freemods",
+    "slot_mods",
+    "seed",
+))
+
+MATCH_SLOTS = 16
+# Slot statuses which have a player in them.
+_SLOT_HAS_PLAYER = 0b1111100
+
+_MATCH_HEAD = struct.Struct("<HBBI")
+_MATCH_SLOTS = struct.Struct(f"<{MATCH_SLOTS}B{MATCH_SLOTS}B")
+_MATCH_TAIL = struct.Struct("<iBBBB")
+_MATCH_SLOT_MODS = struct.Struct(f"<{MATCH_SLOTS}i")
+
+def _pack(writer: PacketWriter, packer: struct.Struct, *values: Any) -> None:
+    writer._buf += packer.pack(*values)
+
+def _read_match(reader: PacketReader) -> Match:
+    buf = reader._buf
+    match_id, in_progress, powerplay, mods = _MATCH_HEAD.unpack_from(
+        buf, reader._pos,
+    )
+    reader._pos += _MATCH_HEAD.size
+    name = reader.read_str()
+    password = reader.read_str()
+    map_name = reader.read_str()
+    map_id = reader.read_i32()
+    map_md5 = reader.read_str()
+
+    slots = _MATCH_SLOTS.unpack_from(buf, reader._pos)
+    reader._pos += _MATCH_SLOTS.size
+    statuses = slots[:MATCH_SLOTS]
+    slot_ids = tuple(
+        reader.read_i32() if status & _SLOT_HAS_PLAYER else 0
+        for status in statuses
+    )
+
+    host_id, mode, win_condition, team_type, freemods = \
+        _MATCH_TAIL.unpack_from(buf, reader._pos)
+    reader._pos += _MATCH_TAIL.size
+    slot_mods: tuple[int, ...] = ()
+    if freemods:
+        slot_mods = _MATCH_SLOT_MODS.unpack_from(buf, reader._pos)
+        reader._pos += _MATCH_SLOT_MODS.size
+
+    return Match(
+        match_id, in_progress == 1, powerplay, mods, name, password, map_name,
+        map_id, map_md5, statuses, slots[MATCH_SLOTS:], slot_ids, host_id,
+        mode, win_condition, team_type, freemods, slot_mods, reader.read_i32(),
+    )
+
+def _write_match(writer: PacketWriter, match: Match) -> None:
+    _pack(
+        writer, _MATCH_HEAD,
+        match.id, match.in_progress, match.powerplay, match.mods,
+    )
+    writer.write_str(match.name)
+    writer.write_str(match.password)
+    writer.write_str(match.map_name)
+    writer.write_i32(match.map_id)
+    writer.write_str(match.map_md5)
+    _pack(writer, _MATCH_SLOTS, *match.slot_statuses, *match.slot_teams)
+    for status, user_id in zip(match.slot_statuses, match.slot_ids):
+        if status & _SLOT_HAS_PLAYER:
+            writer.write_i32(user_id)
+    _pack(
+        writer, _MATCH_TAIL,
+        match.host_id, match.mode, match.win_condition, match.team_type,
+        match.freemods,
+    )
+    if match.freemods:
+        _pack(writer, _MATCH_SLOT_MODS, *match.slot_mods)
+    writer.write_i32(match.seed)
+
+def _read_raw(reader: PacketReader) -> bytes:
+    data = bytes(reader._buf[reader._pos:])
+    reader._pos = len(reader._buf)
+    return data
+
+def _write_raw(writer: PacketWriter, data: bytes) -> None:
+    writer.write_raw(data)
+
+# Variable width field types mapped to their (reader, writer) functions.
+VARIABLE_TYPES: dict[str, tuple[
+    Callable[[PacketReader], Any],
+    Callable[[PacketWriter, Any], Any],
+]] = {
+    "str": (PacketReader.read_str, PacketWriter.write_str),
+    "i32_list": (PacketReader.read_i32_list, PacketWriter.write_i32_list),
+    "match": (_read_match, _write_match),
+    "frame_bundle": (replay.read_frame_bundle, replay.write_frame_bundle),
+    "score_frame": (replay.read_score_frame, replay.write_score_frame),
+    "raw": (_read_raw, _write_raw),
+}
+
+@dataclass
+class PacketCodec:
+    """A compiled decoder and encoder for a single packet layout."""
+
+    packet_id: PacketID
+    fields: tuple[Field, ...]
+    type: type
+    decode: Callable[[PacketReader], Any]
+    write: Callable[..., None]
+
+    def encode(
+        self,
+        *args: Any,
+        buf: Optional[bytearray] = None,
+        **kwargs: Any,
+    ) -> bytearray:
+        """Encodes a full packet (including the header) from field values,
+        optionally appending it to `buf` in place."""
+
+        writer = PacketWriter(buf)
+        self.write(writer, *args, **kwargs)
+        return writer.finish(self.packet_id)
+
+def _group_fields(fields: tuple[Field, ...]) -> list[tuple[Optional[str], list[str]]]:
+    """Groups runs of adjacent fixed width fields together. Returns a list
+    of `(struct format or None, field names)` steps."""
+
+    steps: list[tuple[Optional[str], list[str]]] = []
+    for name, field_type in fields:
+        if field_type in FIXED_TYPES:
+            if steps and steps[-1][0] is not None:
+                fmt, names = steps[-1]
+                steps[-1] = (fmt + FIXED_TYPES[field_type], names + [name])
+            else:
+                steps.append((FIXED_TYPES[field_type], [name]))
+        elif field_type in VARIABLE_TYPES:
+            steps.append((None, [name]))
+        else:
+            raise ValueError(f"Unknown field type {field_type!r} ({name}).")
+    return steps
+
+def _type_name(packet_id: PacketID) -> str:
+    return "".join(part.capitalize() for part in packet_id.name.split("_"))
+
+def compile_codec(packet_id: PacketID, fields: tuple[Field, ...]) -> PacketCodec:
+    """Compiles a packet layout into a specialised decoder and encoder."""
+
+    names = [name for name, _ in fields]
+    field_types = dict(fields)
+    namespace: dict[str, Any] = {}
+    decode_src = ["def decode(_reader):", "    _buf = _reader._buf"]
+    write_src = [f"def write(_writer, {', '.join(names)}):" if names
+                 else "def write(_writer):", "    pass"]
+
+    for idx, (fmt, step_names) in enumerate(_group_fields(fields)):
+        if fmt is not None:
+            compiled = struct.Struct("<" + fmt)
+            namespace[f"_s{idx}"] = compiled
+            targets = ", ".join(step_names) + ","
+            decode_src += [
+                f"    {targets} = _s{idx}.unpack_from(_buf, _reader._pos)",
+                f"    _reader._pos += {compiled.size}",
+            ]
+            write_src.append(f"    _writer._buf += _s{idx}.pack({targets})")
+        else:
+            name = step_names[0]
+            read_fn, write_fn = VARIABLE_TYPES[field_types[name]]
+            namespace[f"_r{idx}"] = read_fn
+            namespace[f"_w{idx}"] = write_fn
+            decode_src.append(f"    {name} = _r{idx}(_reader)")
+            write_src.append(f"    _w{idx}(_writer, {name})")
+
+    decode_src.append(f"    return _T({', '.join(names)})")
+
+    packet_type = namedtuple(_type_name(packet_id), names)
+    namespace["_T"] = packet_type
+    exec("\n".join(decode_src), namespace)
+    exec("\n".join(write_src), namespace)
+
+    return PacketCodec(
+        packet_id=packet_id,
+        fields=fields,
+        type=packet_type,
+        decode=namespace["decode"],
+        write=namespace["write"],
+    )
+
+_codecs: dict[PacketID, PacketCodec] = {}
+
+def get_codec(packet_id: PacketID) -> PacketCodec:
+    """Returns the compiled codec for a packet, compiling it on first use."""
+
+    codec = _codecs.get(packet_id)
+    if codec is None:
+        codec = _codecs[packet_id] = compile_codec(
+            packet_id, SCHEMAS[packet_id],
+        )
+    return codec
+
+def decode(packet_id: PacketID, reader: PacketReader) -> Any:
+    """Decodes the body of a packet into a named tuple of its fields."""
+    return get_codec(packet_id).decode(reader)
+
+def encode(
+    packet_id: PacketID,
+    *args: Any,
+    buf: Optional[bytearray] = None,
+    **kwargs: Any,
+) -> bytearray:
+    """Encodes a packet (including the header) from its field values,
+    optionally appending it to `buf` in place."""
+    return get_codec(packet_id).encode(*args, buf=buf, **kwargs)
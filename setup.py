@@ -24,6 +24,9 @@ setuptools.setup(
     install_requires= [
         "aiohttp",
     ],
+    extras_require= {
+        "numpy": ["numpy"],
+    },
     packages=setuptools.find_packages(),
 
     url= "https://github.com/RealistikDash/osuclient.py",